@@ -1,12 +1,19 @@
 from __future__ import annotations
 
 import os
-from collections.abc import Generator
+import threading
+import time
+from collections.abc import AsyncGenerator, Generator
+from typing import Any
 
-from sqlalchemy import create_engine
+from fastapi import Depends, Request, Response
+from sqlalchemy import Delete, Engine, Insert, Update, create_engine, event, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import Pool
 
 from app.models import Base
+from app.services.metrics import Summary, register_collector
 
 
 def _default_sqlite_url() -> str:
@@ -20,19 +27,264 @@ SQLALCHEMY_DATABASE_URL = os.getenv("MBTI_DATABASE_URL") or os.getenv("DATABASE_
 if SQLALCHEMY_DATABASE_URL and SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+# 可选的只读副本；未配置时所有读取都走主库
+REPLICA_DATABASE_URL = (os.getenv("MBTI_DATABASE_REPLICA_URL") or "").strip() or None
+if REPLICA_DATABASE_URL and REPLICA_DATABASE_URL.startswith("postgres://"):
+    REPLICA_DATABASE_URL = REPLICA_DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
 # 仅针对 SQLite 使用 check_same_thread 参数
 connect_args = {"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {}
 
+_SQLITE_PRAGMA_CHOICES = {
+    "journal_mode": {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"},
+    "synchronous": {"OFF", "NORMAL", "FULL", "EXTRA"},
+}
+
+
+def _env_int(name: str) -> int | None:
+    raw = (os.getenv(name) or "").strip()
+    return int(raw) if raw else None
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    raw = (os.getenv(name) or "").strip().lower()
+    return default if not raw else raw in {"1", "true", "yes", "on"}
+
+
+def _engine_options(url: str) -> dict[str, Any]:
+    # Pool sizing is opt-in; server databases get pre-ping and recycle so idle connections
+    # dropped by the server or a proxy are replaced instead of failing the next request.
+    options: dict[str, Any] = {}
+    for key, env in (
+        ("pool_size", "MBTI_DB_POOL_SIZE"),
+        ("max_overflow", "MBTI_DB_MAX_OVERFLOW"),
+        ("pool_timeout", "MBTI_DB_POOL_TIMEOUT_SECONDS"),
+    ):
+        value = _env_int(env)
+        if value is not None:
+            options[key] = value
+
+    is_sqlite = "sqlite" in url
+    if _env_flag("MBTI_DB_POOL_PRE_PING", not is_sqlite):
+        options["pool_pre_ping"] = True
+    recycle = _env_int("MBTI_DB_POOL_RECYCLE_SECONDS")
+    if recycle is None and not is_sqlite:
+        recycle = 1800
+    if recycle is not None and recycle > 0:
+        options["pool_recycle"] = recycle
+    return options
+
+
+def _sqlite_pragmas() -> list[tuple[str, str]]:
+    # Unset variables leave SQLite's defaults alone; see README for the recommended multi-worker values.
+    pragmas: list[tuple[str, str]] = []
+    for name, env in (("journal_mode", "MBTI_SQLITE_JOURNAL_MODE"), ("synchronous", "MBTI_SQLITE_SYNCHRONOUS")):
+        value = (os.getenv(env) or "").strip().upper()
+        if not value:
+            continue
+        if value not in _SQLITE_PRAGMA_CHOICES[name]:
+            raise ValueError(f"{env} 不支持的取值：{value}")
+        pragmas.append((name, value))
+    for name, env in (("busy_timeout", "MBTI_SQLITE_BUSY_TIMEOUT_MS"), ("mmap_size", "MBTI_SQLITE_MMAP_SIZE")):
+        value = _env_int(env)
+        if value is not None:
+            pragmas.append((name, str(value)))
+    return pragmas
+
+
+def apply_sqlite_pragmas(target: Engine, pragmas: list[tuple[str, str]]) -> None:
+    # Runs on every new DBAPI connection; journal_mode=WAL persists in the file, the rest are per connection.
+    if not pragmas:
+        return
+
+    @event.listens_for(target, "connect")
+    def _set_pragmas(dbapi_connection, _record) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+class _PoolUsage:
+    # How long connections stay checked out of any pool in this process (sync and async engines).
+    # Long holds mean a request kept its connection while waiting on something else, e.g. an AI stream.
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.held_seconds = Summary()
+        # Per instance, so a reloaded module's listener never consumes another instance's entry.
+        self._info_key = f"mbti_checked_out_at:{id(self)}"
+
+    def on_checkout(self, _dbapi_connection, record, _proxy) -> None:
+        record.info[self._info_key] = time.perf_counter()
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def on_checkin(self, _dbapi_connection, record) -> None:
+        started = record.info.pop(self._info_key, None)
+        if started is None:
+            return
+        self.held_seconds.observe(time.perf_counter() - started)
+        with self._lock:
+            self.checked_out -= 1
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            counts = {
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "checkouts": self.checkouts,
+            }
+        return {**counts, "held_seconds": self.held_seconds.snapshot()}
+
+
+pool_usage = _PoolUsage()
+event.listen(Pool, "checkout", pool_usage.on_checkout)
+event.listen(Pool, "checkin", pool_usage.on_checkin)
+register_collector("db_pool", pool_usage.snapshot)
+
+
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args=connect_args,
+    **_engine_options(SQLALCHEMY_DATABASE_URL),
 )
+if "sqlite" in SQLALCHEMY_DATABASE_URL:
+    apply_sqlite_pragmas(engine, _sqlite_pragmas())
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
 
 
+class RoutingSession(Session):
+    # Reads go to the replica; flushes and INSERT/UPDATE/DELETE statements go to the primary, and once
+    # a session has written, its later reads stay on the primary so it sees its own changes.
+
+    def __init__(self, *, primary: Engine, replica: Engine | None, use_primary: bool = False, **kw: Any) -> None:
+        super().__init__(**kw)
+        self.primary = primary
+        self.replica = replica
+        self.use_primary = use_primary or replica is None
+
+    def get_bind(self, mapper=None, clause=None, **kw: Any) -> Engine:
+        if not self.use_primary and (self._flushing or isinstance(clause, (Insert, Update, Delete))):
+            self.use_primary = True
+        return self.primary if self.use_primary else self.replica
+
+
+replica_engine: Engine | None = None
+if REPLICA_DATABASE_URL:
+    replica_engine = create_engine(
+        REPLICA_DATABASE_URL,
+        connect_args={"check_same_thread": False} if "sqlite" in REPLICA_DATABASE_URL else {},
+        **_engine_options(REPLICA_DATABASE_URL),
+    )
+
+ReadSessionLocal = sessionmaker(
+    class_=RoutingSession,
+    primary=engine,
+    replica=replica_engine,
+    autoflush=False,
+    autocommit=False,
+    expire_on_commit=False,
+)
+
+# Read-your-writes: after a write the client reads from the primary until replication has caught up.
+PRIMARY_READS_COOKIE = "mbti_primary_reads_until"
+REPLICA_STICKY_SECONDS = int(os.getenv("MBTI_DATABASE_REPLICA_STICKY_SECONDS", "10"))
+
+
+def pin_reads_to_primary(response: Response) -> None:
+    if not REPLICA_DATABASE_URL or REPLICA_STICKY_SECONDS <= 0:
+        return
+    until = int(time.time()) + REPLICA_STICKY_SECONDS
+    response.set_cookie(
+        PRIMARY_READS_COOKIE, str(until), max_age=REPLICA_STICKY_SECONDS, httponly=True, samesite="lax"
+    )
+
+
+def reads_pinned_to_primary(request: Request) -> bool:
+    try:
+        return int(request.cookies.get(PRIMARY_READS_COOKIE) or 0) > time.time()
+    except ValueError:
+        return False
+
+
+def _async_database_url(url: str) -> str:
+    # The same database through an asyncio driver: aiosqlite for SQLite, asyncpg for PostgreSQL.
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    elif backend == "postgresql":
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+        # asyncpg receives query params as connect() kwargs and has no `sslmode`; it takes the same
+        # mode names (disable ... verify-full) as `ssl`. Hosted URLs often end in ?sslmode=require.
+        sslmode = parsed.query.get("sslmode")
+        if sslmode is not None:
+            parsed = parsed.difference_update_query(["sslmode"])
+            if "ssl" not in parsed.query:
+                parsed = parsed.update_query_dict({"ssl": sslmode})
+    return parsed.render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("MBTI_ASYNC_DATABASE_URL") or _async_database_url(SQLALCHEMY_DATABASE_URL)
+ASYNC_REPLICA_DATABASE_URL = (os.getenv("MBTI_ASYNC_DATABASE_REPLICA_URL") or "").strip() or (
+    _async_database_url(REPLICA_DATABASE_URL) if REPLICA_DATABASE_URL else None
+)
+
+_async_engine: AsyncEngine | None = None
+_async_session_factory: async_sessionmaker[AsyncSession] | None = None
+_async_replica_engine: AsyncEngine | None = None
+_async_read_session_factory: async_sessionmaker[AsyncSession] | None = None
+
+
+def get_async_engine() -> AsyncEngine:
+    # Created on first use, so processes that never serve the async routes do not need the async drivers.
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL))
+        if "sqlite" in ASYNC_DATABASE_URL:
+            apply_sqlite_pragmas(_async_engine.sync_engine, _sqlite_pragmas())
+    return _async_engine
+
+
+def get_async_replica_engine() -> AsyncEngine | None:
+    global _async_replica_engine
+    if _async_replica_engine is None and ASYNC_REPLICA_DATABASE_URL:
+        _async_replica_engine = create_async_engine(
+            ASYNC_REPLICA_DATABASE_URL, **_engine_options(ASYNC_REPLICA_DATABASE_URL)
+        )
+    return _async_replica_engine
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_session_factory, _async_replica_engine, _async_read_session_factory
+    engines = (_async_engine, _async_replica_engine)
+    _async_engine = _async_replica_engine = None
+    _async_session_factory = _async_read_session_factory = None
+    for async_engine in engines:
+        if async_engine is not None:
+            await async_engine.dispose()
+
+
 def init_db() -> None:
     Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist, so indexes added to them later are created here.
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def get_session_factory() -> sessionmaker[Session]:
+    # For work that outlives the request (background jobs) and must open its own sessions.
+    return SessionLocal
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -41,3 +293,56 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+def get_async_session_factory() -> async_sessionmaker[AsyncSession]:
+    global _async_session_factory
+    if _async_session_factory is None:
+        _async_session_factory = async_sessionmaker(
+            bind=get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _async_session_factory
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    # For async def routes: queries await the driver instead of blocking the event loop.
+    async with get_async_session_factory()() as session:
+        yield session
+
+
+def get_read_session_factory() -> sessionmaker[RoutingSession]:
+    return ReadSessionLocal
+
+
+def get_read_db(
+    request: Request,
+    session_factory: sessionmaker[RoutingSession] = Depends(get_read_session_factory),
+) -> Generator[Session, None, None]:
+    # For read-only routes: served by the replica when one is configured.
+    db = session_factory(use_primary=reads_pinned_to_primary(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_async_read_session_factory() -> async_sessionmaker[AsyncSession]:
+    global _async_read_session_factory
+    if _async_read_session_factory is None:
+        replica = get_async_replica_engine()
+        _async_read_session_factory = async_sessionmaker(
+            sync_session_class=RoutingSession,
+            primary=get_async_engine().sync_engine,
+            replica=replica.sync_engine if replica is not None else None,
+            autoflush=False,
+            expire_on_commit=False,
+        )
+    return _async_read_session_factory
+
+
+async def get_async_read_db(
+    request: Request,
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_async_read_session_factory),
+) -> AsyncGenerator[AsyncSession, None]:
+    async with session_factory(use_primary=reads_pinned_to_primary(request)) as session:
+        yield session
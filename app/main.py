@@ -6,9 +6,13 @@ from pathlib import Path
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 
-from app.db import init_db
+from app.db import SessionLocal, dispose_async_engine, init_db
 from app.routes.admin import router as admin_router
 from app.routes.public import router as public_router
+from app.services.error_sink import ErrorLogSink
+from app.services.jobs import create_report_jobs
+from app.services.llm import LLMClientPool
+from app.services.metrics import register_collector
 
 BASE_DIR = Path(__file__).resolve().parent
 
@@ -16,7 +20,17 @@ BASE_DIR = Path(__file__).resolve().parent
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
-    yield
+    app.state.llm_clients = LLMClientPool()
+    app.state.report_jobs = create_report_jobs()
+    app.state.error_sink = ErrorLogSink(SessionLocal)
+    register_collector("error_sink", lambda: app.state.error_sink.snapshot())
+    try:
+        yield
+    finally:
+        await app.state.report_jobs.aclose()
+        await app.state.llm_clients.aclose()
+        await app.state.error_sink.aclose()
+        await dispose_async_engine()
 
 
 app = FastAPI(lifespan=lifespan)
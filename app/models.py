@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from typing import Any
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, JSON, String, Text, UniqueConstraint
+from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Index, Integer, JSON, String, Text, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -79,6 +79,30 @@ class TestItem(Base):
     is_extra: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
 
 
+class TestProgress(Base):
+    __tablename__ = "test_progress"
+
+    test_id: Mapped[int] = mapped_column(ForeignKey("tests.id"), primary_key=True)
+    # Bumped on every answer write; delta syncs must name the revision they were based on.
+    revision: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=utc_now,
+        onupdate=utc_now,
+    )
+
+
+class TestDimensionScore(Base):
+    __tablename__ = "test_dimension_scores"
+
+    # Running totals kept in step with answer writes so finishing a test needs no rescoring.
+    test_id: Mapped[int] = mapped_column(ForeignKey("tests.id"), primary_key=True)
+    dimension: Mapped[str] = mapped_column(String(2), primary_key=True)
+    score: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    answered: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
 class Answer(Base):
     __tablename__ = "answers"
     __table_args__ = (UniqueConstraint("test_id", "question_id", name="uq_answers_test_question"),)
@@ -93,8 +117,34 @@ class Answer(Base):
     question: Mapped["Question"] = relationship("Question")
 
 
+class AiReport(Base):
+    __tablename__ = "ai_reports"
+    __table_args__ = (UniqueConstraint("test_id", "prompt_version", name="uq_ai_reports_test_prompt"),)
+
+    # Finished deep-analysis markdown; replayed instead of calling the LLM again.
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    test_id: Mapped[int] = mapped_column(ForeignKey("tests.id"), nullable=False, index=True)
+    prompt_version: Mapped[str] = mapped_column(String(32), nullable=False)
+    model: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utc_now)
+
+
+class ContentCard(Base):
+    __tablename__ = "content_cards"
+
+    # sha256 of (prompt version, type, conflict pair, bucketed letter dims); see analysis_card_content.
+    cache_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    prompt_version: Mapped[str] = mapped_column(String(32), nullable=False)
+    mbti_type: Mapped[str] = mapped_column(String(10), nullable=False)
+    fun_data: Mapped[dict[str, Any]] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utc_now)
+
+
 class Feedback(Base):
     __tablename__ = "feedback"
+    # Keyset pagination on the admin dashboard walks (created_at, id).
+    __table_args__ = (Index("ix_feedback_created_at_id", "created_at", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     mbti_type: Mapped[str | None] = mapped_column(String(10), nullable=True)
@@ -108,6 +158,7 @@ class Feedback(Base):
 
 class ErrorLog(Base):
     __tablename__ = "error_logs"
+    __table_args__ = (Index("ix_error_logs_created_at_id", "created_at", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     error_type: Mapped[str | None] = mapped_column(String(50), nullable=True)
@@ -117,3 +168,11 @@ class ErrorLog(Base):
 
     def __repr__(self) -> str:
         return f"<ErrorLog {self.error_type} - {self.created_at}>"
+
+
+class TableCounter(Base):
+    __tablename__ = "table_counters"
+
+    # Row counts and sums kept in step with writes so the admin dashboard never scans whole tables.
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
@@ -8,13 +8,15 @@ from typing import Any
 
 from fastapi import APIRouter, Depends, File, Form, Request, UploadFile
 from fastapi import HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
 from app.db import get_db
 from app.models import Question
 from app.seeding import seed_questions_if_empty
+from app.services.metrics import collect_metrics
+from app.services.question_bank import invalidate_question_bank
 from app.security import (
     ADMIN_SESSION_COOKIE,
     ADMIN_SESSION_MAX_AGE_SECONDS,
@@ -173,6 +175,7 @@ def create_question(
     )
     db.add(q)
     db.commit()
+    invalidate_question_bank()
     return RedirectResponse(url=f"/admin/questions/{q.id}", status_code=303)
 
 
@@ -213,6 +216,7 @@ def update_question(
     q.is_active = bool(is_active)
     q.source = source.strip() or "ai"
     db.commit()
+    invalidate_question_bank()
     return RedirectResponse(url=f"/admin/questions/{q.id}", status_code=303)
 
 
@@ -229,9 +233,15 @@ def toggle_question(
         raise HTTPException(status_code=404, detail="题目不存在")
     q.is_active = not bool(q.is_active)
     db.commit()
+    invalidate_question_bank()
     return RedirectResponse(url="/admin/questions", status_code=303)
 
 
+@router.get("/metrics", dependencies=[Depends(require_admin)])
+def metrics():
+    return JSONResponse(collect_metrics(), headers={"Cache-Control": "no-store"})
+
+
 @router.get("/export", dependencies=[Depends(require_admin)])
 def export_questions(db: Session = Depends(get_db)):
     qs = db.query(Question).order_by(Question.id.asc()).all()
@@ -290,5 +300,6 @@ def import_questions(
         db.add(q)
         inserted += 1
     db.commit()
+    invalidate_question_bank()
     return RedirectResponse(url="/admin/questions", status_code=303)
 
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+from collections.abc import Sequence
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from functools import partial
 import html
 import hashlib
 import json
@@ -10,24 +14,73 @@ import re
 import traceback
 from io import BytesIO
 from pathlib import Path
-from typing import Any
-from urllib.parse import quote_plus
+from typing import Any, NamedTuple
+from urllib.parse import quote_plus, urlencode
 
-from fastapi import APIRouter, Depends, Form, Request, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, Form, Request, Query
 from fastapi import HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from json_repair import repair_json
 from openpyxl import Workbook
-from sqlalchemy import func
+from sqlalchemy import delete, exists, func, insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import Session, joinedload
 
-from app.db import get_db
-from app.models import Answer, ErrorLog, Feedback, Question, Test, TestItem
+from app.db import (
+    get_async_db,
+    get_async_read_db,
+    get_async_session_factory,
+    get_db,
+    get_read_db,
+    pin_reads_to_primary,
+)
+from app.models import (
+    AiReport,
+    Answer,
+    ContentCard,
+    ErrorLog,
+    Feedback,
+    Question,
+    Test,
+    TestDimensionScore,
+    TestItem,
+    TestProgress,
+    utc_now,
+)
 from app.seeding import seed_questions_if_empty
+from app.services.cache import TTLCache
+from app.services.counters import (
+    ERROR_LOG_COUNT,
+    FEEDBACK_COUNT,
+    FEEDBACK_RATING_SUM,
+    bump_counters,
+    read_counters,
+    reset_counters,
+)
+from app.services.error_sink import ErrorLogSink, get_error_sink
+from app.services.jobs import BackgroundJobQueue, get_report_jobs
+from app.services.llm import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_CARD,
+    PRIORITY_INTERACTIVE,
+    CircuitOpenError,
+    LLMClientPool,
+    Subscription,
+    get_llm_clients,
+    llm_breaker,
+    llm_flights,
+    llm_scheduler,
+    prompt_fingerprint,
+    stream_chat_text,
+)
+from app.services.markdown_stream import sanitize_markdown_stream
+from app.services.profile_context import build_profile_context
+from app.services.question_bank import get_question_bank
 from app.services.reporting import build_report_context
 from app.services.selection import select_balanced
-from app.services.scoring import is_near_boundary, score_all
+from app.services.scoring import _DIMS, boundary_notes, compile_scoring_plan, score_totals
 from app.services.tokens import expiry_from_choice, hash_token, new_url_token
 
 try:
@@ -48,49 +101,89 @@ TEST_COOKIE = "test_token"
 
 
 @dataclass
-class SimplePagination:
+class KeysetPage:
     items: list[Any]
-    page: int
-    per_page: int
     total: int
-    pages: int
+    prev_cursor: str | None = None
+    next_cursor: str | None = None
 
     @property
     def has_prev(self) -> bool:
-        return self.page > 1
+        return self.prev_cursor is not None
 
     @property
     def has_next(self) -> bool:
-        return self.page < self.pages
+        return self.next_cursor is not None
 
-    @property
-    def prev_num(self) -> int:
-        return self.page - 1 if self.has_prev else 1
 
-    @property
-    def next_num(self) -> int:
-        return self.page + 1 if self.has_next else self.pages
+def _encode_cursor(row: Any) -> str:
+    raw = f"{row.created_at.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
 
+def _decode_cursor(cursor: str | None) -> tuple[datetime, int] | None:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
 
-def _paginate_query(query, page: int, per_page: int = 5) -> SimplePagination:
-    safe_per_page = max(1, int(per_page))
-    safe_page = max(1, int(page))
 
-    total = int(query.order_by(None).count())
-    pages = max(1, (total + safe_per_page - 1) // safe_per_page)
+async def _keyset_page(
+    db: AsyncSession,
+    model: Any,
+    *,
+    total: int,
+    after: str | None = None,
+    before: str | None = None,
+    per_page: int = 5,
+) -> KeysetPage:
+    # Newest first. Pages continue from a (created_at, id) cursor instead of an OFFSET, so every page
+    # is one range scan of the composite index however deep it is.
+    per_page = max(1, int(per_page))
+    key = tuple_(model.created_at, model.id)
+
+    newer = _decode_cursor(before)
+    if newer is not None:
+        stmt = select(model).where(key > tuple_(*newer)).order_by(model.created_at.asc(), model.id.asc())
+        rows = list((await db.scalars(stmt.limit(per_page + 1))).all())
+        if len(rows) > per_page:
+            rows = rows[:per_page][::-1]
+            return KeysetPage(rows, total, prev_cursor=_encode_cursor(rows[0]), next_cursor=_encode_cursor(rows[-1]))
+        # Fewer than a page of newer rows left: that is the first page.
+
+    older = _decode_cursor(after) if newer is None else None
+    stmt = select(model).order_by(model.created_at.desc(), model.id.desc())
+    if older is not None:
+        stmt = stmt.where(key < tuple_(*older))
+    rows = list((await db.scalars(stmt.limit(per_page + 1))).all())
+    if older is not None and not rows:
+        return await _keyset_page(db, model, total=total, per_page=per_page)
+
+    return KeysetPage(
+        rows[:per_page],
+        total,
+        prev_cursor=_encode_cursor(rows[0]) if older is not None else None,
+        next_cursor=_encode_cursor(rows[per_page - 1]) if len(rows) > per_page else None,
+    )
 
-    if safe_page > pages:
-        safe_page = pages
 
-    items = query.offset((safe_page - 1) * safe_per_page).limit(safe_per_page).all()
+_DASHBOARD_CURSORS = {"feedback": ("feedback_after", "feedback_before"), "errors": ("error_after", "error_before")}
 
-    return SimplePagination(
-        items=items,
-        page=safe_page,
-        per_page=safe_per_page,
-        total=total,
-        pages=pages,
-    )
+
+def _dashboard_link(request: Request, tab: str, *, after: str | None = None, before: str | None = None) -> str:
+    # Keeps the other list's position and the admin key; replaces this list's cursor.
+    params = {k: v for k, v in request.query_params.items() if k not in _DASHBOARD_CURSORS[tab] and k != "active_tab"}
+    after_param, before_param = _DASHBOARD_CURSORS[tab]
+    if after:
+        params[after_param] = after
+    if before:
+        params[before_param] = before
+    params["active_tab"] = tab
+    return f"{request.url.path}?{urlencode(params)}"
 
 
 def _app_secret() -> str:
@@ -116,17 +209,238 @@ def _as_utc(dt: datetime) -> datetime:
     return dt.astimezone(timezone.utc)
 
 
-def _get_test_from_cookie(request: Request, db: Session) -> Test:
-    secret = _app_secret()
+class _TokenEntry(NamedTuple):
+    test_id: int
+    status: str
+    expires_at: datetime | None
+
+
+# Token hash -> test, so autosaves and AI streams skip the indexed token lookup.
+# Status changes in this process drop the entry; other workers may serve a stale status until the TTL,
+# so writes re-check the status in SQL (_bump_revision) and only use the cached test id.
+_token_cache: TTLCache[str, _TokenEntry] = TTLCache(
+    maxsize=int(os.getenv("MBTI_TOKEN_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("MBTI_TOKEN_CACHE_TTL_SECONDS", "300")),
+)
+
+
+def _lookup_token(db: Session, column: Any, expires_column: Any, token_hash: str) -> _TokenEntry | None:
+    entry = _token_cache.get(token_hash)
+    if entry is not None:
+        return entry
+
+    row = db.query(Test.id, Test.status, expires_column).filter(column == token_hash).one_or_none()
+    if row is None:
+        return None
+    test_id, status, expires_at = row
+    entry = _TokenEntry(int(test_id), str(status), _as_utc(expires_at) if expires_at else None)
+    _token_cache.set(token_hash, entry)
+    return entry
+
+
+def _share_token_entry(db: Session, share_token: str) -> _TokenEntry | None:
+    token_hash = hash_token(share_token, secret=_app_secret())
+    return _lookup_token(db, Test.share_token_hash, Test.share_expires_at, token_hash)
+
 
+def _test_id_from_cookie(request: Request, db: Session) -> int:
+    token = request.cookies.get(TEST_COOKIE)
+    if not token:
+        raise HTTPException(status_code=401, detail="缺少测试会话")
+
+    token_hash = hash_token(token, secret=_app_secret())
+    entry = _lookup_token(db, Test.test_token_hash, Test.resume_expires_at, token_hash)
+    if entry is None:
+        raise HTTPException(status_code=401, detail="缺少测试会话")
+    if entry.status != "in_progress":
+        raise HTTPException(status_code=400, detail="该测试已结束")
+    if entry.expires_at and datetime.now(timezone.utc) > entry.expires_at:
+        db.query(Test).filter(Test.id == entry.test_id, Test.status == "in_progress").update(
+            {"status": "expired"}, synchronize_session=False
+        )
+        db.commit()
+        _token_cache.pop(token_hash)
+        raise HTTPException(status_code=401, detail="该测试已过期")
+    return entry.test_id
+
+
+def _forget_test_token(request: Request) -> None:
     token = request.cookies.get(TEST_COOKIE)
     if token:
-        token_hash = hash_token(token, secret=secret)
-        test_row = db.query(Test).filter(Test.test_token_hash == token_hash).one_or_none()
-        if test_row:
-            return _validate_in_progress_test(db, test_row)
+        _token_cache.pop(hash_token(token, secret=_app_secret()))
+
+
+def _get_test_from_cookie(request: Request, db: Session) -> Test:
+    test_row = db.get(Test, _test_id_from_cookie(request, db))
+    if test_row is None:
+        raise HTTPException(status_code=401, detail="缺少测试会话")
+    return _validate_in_progress_test(db, test_row)
+
+
+def _insert_test_items(
+    db: Session,
+    test_id: int,
+    question_ids: Sequence[int],
+    *,
+    start_position: int = 1,
+    is_extra: bool = False,
+) -> None:
+    # One batched INSERT (executemany / multi-row VALUES) instead of an ORM object per item.
+    if not question_ids:
+        return
+    db.execute(
+        insert(TestItem),
+        [
+            {"test_id": test_id, "position": pos, "question_id": int(qid), "is_extra": is_extra}
+            for pos, qid in enumerate(question_ids, start=start_position)
+        ],
+    )
+
+
+def _upsert_answers(db: Session, test_id: int, values: dict[int, int], *, now: datetime) -> set[int]:
+    # Single INSERT ... ON CONFLICT (test_id, question_id) DO UPDATE backed by uq_answers_test_question.
+    # Every row is either inserted or updated, so the written set is exactly the submitted keys.
+    if not values:
+        return set()
+
+    rows = [
+        {"test_id": test_id, "question_id": int(qid), "value": int(val), "answered_at": now}
+        for qid, val in values.items()
+    ]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        stmt = dialect_insert(Answer).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Answer.test_id, Answer.question_id],
+            set_={"value": stmt.excluded.value, "answered_at": stmt.excluded.answered_at},
+        )
+        db.execute(stmt)
+        return set(values)
+
+    existing = {
+        int(a.question_id): a
+        for a in db.query(Answer).filter(Answer.test_id == test_id, Answer.question_id.in_(list(values))).all()
+    }
+    for row in rows:
+        answer = existing.get(row["question_id"])
+        if answer:
+            answer.value = row["value"]
+            answer.answered_at = now
+        else:
+            db.add(Answer(**row))
+    db.flush()
+    return set(values)
+
+
+def _apply_score_deltas(db: Session, test_id: int, values: dict[int, int]) -> None:
+    # Keep TestDimensionScore in step with an upsert of `values`; must run before the upsert
+    # (it diffs against the stored values) and after _bump_revision (which serializes writers).
+    if not values:
+        return
+
+    previous = {
+        int(qid): int(value)
+        for qid, value in db.query(Answer.question_id, Answer.value)
+        .filter(Answer.test_id == test_id, Answer.question_id.in_(list(values)))
+        .all()
+    }
+
+    index = get_question_bank(db).scoring_plan.index
+    unknown = [qid for qid in values if qid not in index]
+    if unknown:
+        # Questions deactivated after the test started are no longer in the snapshot.
+        extra = compile_scoring_plan(
+            db.query(Question.id, Question.dimension, Question.agree_pole).filter(Question.id.in_(unknown)).all()
+        )
+        index = {**index, **extra.index}
+
+    deltas = [[0, 0] for _ in _DIMS]
+    for qid, value in values.items():
+        entry = index.get(qid)
+        if entry is None:
+            continue
+        dim_index, sign = entry
+        acc = deltas[dim_index]
+        acc[0] += sign * (value - 3)
+        if qid in previous:
+            acc[0] -= sign * (previous[qid] - 3)
+        else:
+            acc[1] += 1
 
-    raise HTTPException(status_code=401, detail="缺少测试会话")
+    for dim, (d_score, d_answered) in zip(_DIMS, deltas):
+        if not d_score and not d_answered:
+            continue
+        db.execute(
+            update(TestDimensionScore)
+            .where(TestDimensionScore.test_id == test_id, TestDimensionScore.dimension == dim)
+            .values(
+                score=TestDimensionScore.score + d_score,
+                answered=TestDimensionScore.answered + d_answered,
+            )
+        )
+
+
+def _save_answers(db: Session, test_id: int, values: dict[int, int], *, now: datetime) -> set[int]:
+    _apply_score_deltas(db, test_id, values)
+    return _upsert_answers(db, test_id, values, now=now)
+
+
+def _current_revision(db: Session, test_id: int) -> int | None:
+    return db.query(TestProgress.revision).filter(TestProgress.test_id == test_id).scalar()
+
+
+def _bump_revision(db: Session, test_id: int, *, expected: int | None = None) -> int | None:
+    # Compare-and-set when `expected` is given; returns None if the client's base revision is stale.
+    # The UPDATE also takes the row lock that serializes concurrent saves of the same test.
+    # Its status condition is what stops writes to a finished test; cached token entries may be stale.
+    in_progress = exists().where(Test.id == test_id, Test.status == "in_progress")
+    stmt = update(TestProgress).where(TestProgress.test_id == test_id, in_progress)
+    if expected is not None:
+        stmt = stmt.where(TestProgress.revision == expected)
+    result = db.execute(stmt.values(revision=TestProgress.revision + 1, updated_at=utc_now()))
+    if result.rowcount:
+        return expected + 1 if expected is not None else _current_revision(db, test_id)
+
+    if db.query(Test.status).filter(Test.id == test_id).scalar() != "in_progress":
+        raise HTTPException(status_code=400, detail="该测试已结束")
+
+    # Tests started before revisions existed have no progress row yet.
+    if expected in (None, 0) and _current_revision(db, test_id) is None:
+        db.add(TestProgress(test_id=test_id, revision=1))
+        db.flush()
+        return 1
+    return None
+
+
+def _parse_answer_values(raw_answers: object) -> dict[int, int]:
+    # De-duplicate answers by question_id; keep the last value.
+    values: dict[int, int] = {}
+    if isinstance(raw_answers, dict):
+        for k, v in raw_answers.items():
+            try:
+                qid = int(k)
+                val = int(v)
+            except Exception:
+                continue
+            values[qid] = val
+    elif isinstance(raw_answers, list):
+        for it in raw_answers:
+            if not isinstance(it, dict):
+                continue
+            try:
+                qid = int(it.get("question_id"))
+                val = int(it.get("value"))
+            except Exception:
+                continue
+            values[qid] = val
+    else:
+        raise HTTPException(status_code=400, detail="answers 格式不合法")
+    return values
 
 
 def _validate_in_progress_test(db: Session, test_row: Test) -> Test:
@@ -148,7 +462,7 @@ def home(
     # Minimal home page; enhanced later with resume/continue logic.
     has_in_progress = False
     try:
-        _get_test_from_cookie(request, db)
+        _test_id_from_cookie(request, db)
         has_in_progress = True
     except HTTPException:
         has_in_progress = False
@@ -201,10 +515,11 @@ def start(
     legacy_resume_token = new_url_token()
     legacy_resume_code = new_url_token(8)
 
-    seed_questions_if_empty(db)
-    active_questions = db.query(Question).filter(Question.is_active.is_(True)).all()
+    bank = get_question_bank(db)
+    if not bank.questions and seed_questions_if_empty(db):
+        bank = get_question_bank(db)
     try:
-        picked = select_balanced(active_questions, total=mode)
+        picked = select_balanced(bank.questions, total=mode)
     except ValueError:
         return RedirectResponse(url="/?error=question_bank_insufficient", status_code=303)
 
@@ -221,9 +536,12 @@ def start(
     db.add(test_row)
     db.flush()
 
-    for idx, q in enumerate(picked, start=1):
-        db.add(TestItem(test_id=test_row.id, position=idx, question_id=q.id, is_extra=False))
-
+    _insert_test_items(db, test_row.id, [q.id for q in picked])
+    db.add(TestProgress(test_id=test_row.id, revision=0))
+    db.execute(
+        insert(TestDimensionScore),
+        [{"test_id": test_row.id, "dimension": d, "score": 0, "answered": 0} for d in ("EI", "SN", "TF", "JP")],
+    )
     db.commit()
 
     response = RedirectResponse(url="/test", status_code=303)
@@ -247,7 +565,6 @@ def test_page(request: Request, db: Session = Depends(get_db), pos: int | None =
         raise HTTPException(status_code=400, detail="该测试没有题目")
 
     items = [it for it, _q in rows]
-    used_ids = {int(it.question_id) for it in items}
     answers = db.query(Answer).filter(Answer.test_id == test_row.id).all()
     answer_map = {int(a.question_id): int(a.value) for a in answers}
 
@@ -264,27 +581,10 @@ def test_page(request: Request, db: Session = Depends(get_db), pos: int | None =
             }
         )
 
-    # Tie-breaker questions pool (preferred: source == "tie_breaker"; fallback: any unused active questions).
-    # Note: the current Question model doesn't have a `category` column; `source` acts as the tie-breaker marker.
-    tie_rows = db.query(Question).filter(Question.is_active.is_(True), Question.source == "tie_breaker").all()
-    if not tie_rows:
-        q = db.query(Question).filter(Question.is_active.is_(True))
-        if used_ids:
-            q = q.filter(~Question.id.in_(used_ids))
-        tie_rows = q.all()
-
-    dim_pair = {"EI": "E-I", "SN": "S-N", "TF": "T-F", "JP": "J-P"}
-    tie_breakers: dict[str, list[dict[str, object]]] = {}
-    for q in tie_rows:
-        key = dim_pair.get(str(q.dimension), str(q.dimension))
-        tie_breakers.setdefault(key, []).append(
-            {
-                "id": int(q.id),
-                "text": q.text,
-                "dimension": q.dimension,
-                "agree_pole": q.agree_pole,
-            }
-        )
+    # The tie-breaker pool is shared by every test; the page only links its current version.
+    _body, tie_breakers_etag = get_question_bank(db).tie_breaker_payload
+    tie_breakers_version = quote_plus(tie_breakers_etag.strip('"'))
+    tie_breakers_url = f"{request.url_for('tie_breaker_pool')}?v={tie_breakers_version}"
 
     initial_index = 0
     for idx, it in enumerate(items):
@@ -302,7 +602,8 @@ def test_page(request: Request, db: Session = Depends(get_db), pos: int | None =
         {
             "questions_json": json.dumps(questions_data, ensure_ascii=False),
             "answers_json": json.dumps(answer_map, ensure_ascii=False),
-            "tie_breakers_json": json.dumps(tie_breakers, ensure_ascii=False),
+            "revision": _current_revision(db, test_row.id) or 0,
+            "tie_breakers_url": tie_breakers_url,
             "initial_index": initial_index,
             "csrf_token": csrf,
         },
@@ -312,142 +613,145 @@ def test_page(request: Request, db: Session = Depends(get_db), pos: int | None =
     return response
 
 
+@router.get("/test/tie_breakers", name="tie_breaker_pool")
+def tie_breaker_pool(request: Request, db: Session = Depends(get_db), v: str | None = None):
+    body, etag = get_question_bank(db).tie_breaker_payload
+    if v and f'"{v}"' == etag:
+        # Versioned URL embedded by /test: its content never changes.
+        cache_control = "public, max-age=86400, immutable"
+    else:
+        cache_control = "public, max-age=60"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+
+    if_none_match = request.headers.get("if-none-match") or ""
+    if etag in {t.strip() for t in if_none_match.split(",")}:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json; charset=utf-8", headers=headers)
+
+
 @router.post("/test/answers")
-async def test_answers(request: Request, db: Session = Depends(get_db)):
+async def test_answers(request: Request, db: AsyncSession = Depends(get_async_db)):
     payload = await request.json()
     csrf_token = payload.get("csrf_token")
     if not isinstance(csrf_token, str):
         raise HTTPException(status_code=400, detail="缺少 csrf_token")
     _require_csrf(request, csrf_token)
 
-    test_row = _get_test_from_cookie(request, db)
+    # The save reuses the sync helpers; run_sync drives them over the async connection.
+    return await db.run_sync(_apply_autosave, request, payload)
+
+
+def _apply_autosave(db: Session, request: Request, payload: dict[str, Any]) -> Response:
+    test_id = _test_id_from_cookie(request, db)
 
     intent = payload.get("intent") or "save"
-    raw_answers = payload.get("answers")
+
+    # Delta sync: {"base_revision": n, "changes": {...}} carries only answers changed since revision n.
+    # Legacy/full sync: {"answers": {...}} carries the whole map and is applied unconditionally.
+    base_revision: int | None = None
+    if "base_revision" in payload:
+        try:
+            base_revision = int(payload.get("base_revision"))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="base_revision 不合法")
+        raw_answers = payload.get("changes")
+    else:
+        raw_answers = payload.get("answers")
     if raw_answers is None:
         raise HTTPException(status_code=400, detail="缺少 answers")
 
-    items = (
-        db.query(TestItem)
-        .filter(TestItem.test_id == test_row.id)
-        .order_by(TestItem.position.asc())
-        .all()
-    )
-    item_ids = {int(it.question_id) for it in items}
-    if not item_ids:
-        raise HTTPException(status_code=400, detail="该测试没有题目")
+    to_upsert_map = _parse_answer_values(raw_answers)
 
-    # De-duplicate answers by question_id; keep the last value.
-    to_upsert_map: dict[int, int] = {}
-    if isinstance(raw_answers, dict):
-        for k, v in raw_answers.items():
-            try:
-                qid = int(k)
-                val = int(v)
-            except Exception:
-                continue
-            to_upsert_map[qid] = val
-    elif isinstance(raw_answers, list):
-        for it in raw_answers:
-            if not isinstance(it, dict):
-                continue
-            try:
-                qid = int(it.get("question_id"))
-                val = int(it.get("value"))
-            except Exception:
-                continue
-            to_upsert_map[qid] = val
-    else:
-        raise HTTPException(status_code=400, detail="answers 格式不合法")
+    try:
+        revision = _bump_revision(db, test_id, expected=base_revision)
+    except HTTPException:
+        db.rollback()
+        _forget_test_token(request)  # the cached entry said in_progress; it is out of date
+        raise
+    if revision is None:
+        db.rollback()
+        return JSONResponse(
+            {"status": "conflict", "revision": _current_revision(db, test_id)},
+            status_code=409,
+        )
 
-    to_upsert: list[tuple[int, int]] = list(to_upsert_map.items())
+    # Validate only the submitted question ids instead of the whole test.
+    item_ids: set[int] = set()
+    if to_upsert_map:
+        item_ids = {
+            int(qid)
+            for (qid,) in db.query(TestItem.question_id)
+            .filter(TestItem.test_id == test_id, TestItem.question_id.in_(list(to_upsert_map)))
+            .all()
+        }
 
     # Allow client-side scheduled extra (tie-breaker) questions:
     # create TestItem rows for new question ids so server-side scoring includes them.
-    extra_qids = [qid for qid, _v in to_upsert if qid not in item_ids]
+    extra_qids = [qid for qid in to_upsert_map if qid not in item_ids]
     if extra_qids:
-        existing_extra = sum(1 for it in items if bool(getattr(it, "is_extra", False)))
-        remaining = max(0, int(test_row.extra_max) - int(existing_extra))
+        max_pos, existing_extra = (
+            db.query(func.max(TestItem.position), func.count(TestItem.id).filter(TestItem.is_extra.is_(True)))
+            .filter(TestItem.test_id == test_id)
+            .one()
+        )
+        if max_pos is None:
+            raise HTTPException(status_code=400, detail="该测试没有题目")
+        extra_max = db.query(Test.extra_max).filter(Test.id == test_id).scalar()
+        remaining = max(0, int(extra_max or 0) - int(existing_extra or 0))
         if remaining <= 0:
             raise HTTPException(status_code=400, detail="加测题数量已达上限")
 
         extra_qids = extra_qids[:remaining]
-        has_dedicated_tie_pool = (
-            db.query(Question.id)
-            .filter(Question.is_active.is_(True), Question.source == "tie_breaker")
-            .limit(1)
-            .scalar()
-            is not None
-        )
+        bank = get_question_bank(db)
+        has_dedicated_tie_pool = bank.has_source("tie_breaker")
 
-        q_query = db.query(Question).filter(Question.id.in_(extra_qids), Question.is_active.is_(True))
-        if has_dedicated_tie_pool:
-            q_query = q_query.filter(Question.source == "tie_breaker")
-        q_rows = q_query.all()
-        q_by_id = {int(q.id): q for q in q_rows}
+        q_by_id = {
+            qid: bank.by_id[qid]
+            for qid in extra_qids
+            if qid in bank.by_id and (not has_dedicated_tie_pool or bank.by_id[qid].source == "tie_breaker")
+        }
 
-        max_pos = int(items[-1].position) if items else 0
         allowed_dims = {"EI", "SN", "TF", "JP"}
-        for qid in extra_qids:
-            q = q_by_id.get(int(qid))
-            if not q:
-                continue
-            if str(q.dimension) not in allowed_dims:
-                continue
-            max_pos += 1
-            db.add(TestItem(test_id=test_row.id, position=max_pos, question_id=int(qid), is_extra=True))
-        db.commit()
-
-        # refresh item ids after appending extras
-        items = (
-            db.query(TestItem)
-            .filter(TestItem.test_id == test_row.id)
-            .order_by(TestItem.position.asc())
-            .all()
-        )
-        item_ids = {int(it.question_id) for it in items}
-
-    now = datetime.now(timezone.utc)
-    existing = db.query(Answer).filter(Answer.test_id == test_row.id).all()
-    existing_map = {int(a.question_id): a for a in existing}
-
-    for qid, val in to_upsert:
-        if qid not in item_ids:
-            continue
-        if val < 1 or val > 5:
-            continue
-        row = existing_map.get(qid)
-        if row:
-            row.value = val
-            row.answered_at = now
-        else:
-            db.add(Answer(test_id=test_row.id, question_id=qid, value=val, answered_at=now))
-
+        appended = [
+            qid for qid in extra_qids if qid in q_by_id and str(q_by_id[qid].dimension) in allowed_dims
+        ]
+        _insert_test_items(db, test_id, appended, start_position=int(max_pos) + 1, is_extra=True)
+        item_ids.update(appended)
+
+    valid = {qid: val for qid, val in to_upsert_map.items() if qid in item_ids and 1 <= val <= 5}
+    saved_ids = _save_answers(db, test_id, valid, now=datetime.now(timezone.utc))
     db.commit()
 
     if intent == "finish":
-        saved_ids = {
-            int(qid)
-            for (qid,) in db.query(Answer.question_id).filter(Answer.test_id == test_row.id).all()
-        }
-        missing = None
-        for pos_it in (
-            db.query(TestItem)
-            .filter(TestItem.test_id == test_row.id)
+        item_positions = [
+            (int(pos), int(qid))
+            for pos, qid in db.query(TestItem.position, TestItem.question_id)
+            .filter(TestItem.test_id == test_id)
             .order_by(TestItem.position.asc())
             .all()
-        ):
-            if int(pos_it.question_id) not in saved_ids:
-                missing = int(pos_it.position)
-                break
+        ]
+        if not item_positions:
+            raise HTTPException(status_code=400, detail="该测试没有题目")
+        # Only items not covered by this request need a lookup; a full-map finish needs none.
+        unsaved = [qid for _pos, qid in item_positions if qid not in saved_ids]
+        if unsaved:
+            saved_ids |= {
+                int(qid)
+                for (qid,) in db.query(Answer.question_id)
+                .filter(Answer.test_id == test_id, Answer.question_id.in_(unsaved))
+                .all()
+            }
+        missing = next((pos for pos, qid in item_positions if qid not in saved_ids), None)
         if missing is not None:
-            return JSONResponse({"status": "incomplete", "redirect": "/test", "missing_position": missing})
-        return JSONResponse({"status": "complete", "redirect": "/finish"})
+            return JSONResponse(
+                {"status": "incomplete", "redirect": "/test", "missing_position": missing, "revision": revision}
+            )
+        return JSONResponse({"status": "complete", "redirect": "/finish", "revision": revision})
 
     if intent == "exit":
-        return JSONResponse({"status": "exit", "redirect": "/"})
+        return JSONResponse({"status": "exit", "redirect": "/", "revision": revision})
 
-    return JSONResponse({"status": "saved"})
+    return JSONResponse({"status": "saved", "revision": revision})
 
 
 @router.post("/test")
@@ -476,23 +780,8 @@ def test_submit(
         if v < 1 or v > 5:
             raise HTTPException(status_code=400, detail="选项不合法")
 
-        existing = (
-            db.query(Answer)
-            .filter(Answer.test_id == test_row.id, Answer.question_id == int(question_id))
-            .one_or_none()
-        )
-        if existing:
-            existing.value = v
-            existing.answered_at = datetime.now(timezone.utc)
-        else:
-            db.add(
-                Answer(
-                    test_id=test_row.id,
-                    question_id=int(question_id),
-                    value=v,
-                    answered_at=datetime.now(timezone.utc),
-                )
-            )
+        _bump_revision(db, test_row.id)
+        _save_answers(db, test_row.id, {int(question_id): v}, now=datetime.now(timezone.utc))
         db.commit()
 
     if nav == "exit":
@@ -536,20 +825,37 @@ def _first_missing_position(items: list[TestItem], answer_map: dict[int, int]) -
     return None
 
 
+def _score_completed_test(db: Session, test_id: int) -> dict[str, Any] | None:
+    # Returns None while any item is unanswered.
+    totals = {
+        str(dim): (int(score), int(answered))
+        for dim, score, answered in db.query(
+            TestDimensionScore.dimension, TestDimensionScore.score, TestDimensionScore.answered
+        ).filter(TestDimensionScore.test_id == test_id)
+    }
+    if len(totals) == 4:
+        item_count = int(db.query(func.count(TestItem.id)).filter(TestItem.test_id == test_id).scalar() or 0)
+        if item_count and sum(answered for _score, answered in totals.values()) == item_count:
+            return score_totals(totals)
+
+    # Tests without running totals (or with unanswered items) take the full path.
+    items, questions = _load_test_questions(db, test_id)
+    answer_map = _load_answers(db, test_id)
+    if _first_missing_position(items, answer_map) is not None:
+        return None
+    plan = get_question_bank(db).scoring_plan
+    if any(q.id not in plan for q in questions):
+        plan = compile_scoring_plan(questions)
+    return plan.score(answer_map)
+
+
 @router.get("/finish", response_class=HTMLResponse)
 def finish_page(request: Request, db: Session = Depends(get_db)):
     test_row = _get_test_from_cookie(request, db)
-    items, questions = _load_test_questions(db, test_row.id)
-    answer_map = _load_answers(db, test_row.id)
-
-    missing = _first_missing_position(items, answer_map)
-    if missing is not None:
+    scoring = _score_completed_test(db, test_row.id)
+    if scoring is None:
         return RedirectResponse(url="/test", status_code=303)
 
-    scoring = score_all(
-        [{"id": q.id, "dimension": q.dimension, "agree_pole": q.agree_pole} for q in questions],
-        answer_map,
-    )
     dims = scoring["dimensions"]
 
     csrf, should_set = _csrf_token(request)
@@ -570,31 +876,25 @@ def finish_page(request: Request, db: Session = Depends(get_db)):
 @router.post("/finish")
 def finish_submit(
     request: Request,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_async_session_factory),
+    llm: LLMClientPool = Depends(get_llm_clients),
+    jobs: BackgroundJobQueue = Depends(get_report_jobs),
+    errors: ErrorLogSink = Depends(get_error_sink),
     csrf_token: str = Form(...),
     share_expiry: str = Form(...),
 ):
     _require_csrf(request, csrf_token)
     test_row = _get_test_from_cookie(request, db)
 
-    items, questions = _load_test_questions(db, test_row.id)
-    answer_map = _load_answers(db, test_row.id)
-    missing = _first_missing_position(items, answer_map)
-    if missing is not None:
+    scoring = _score_completed_test(db, test_row.id)
+    if scoring is None:
         return RedirectResponse(url="/test", status_code=303)
 
-    scoring = score_all(
-        [{"id": q.id, "dimension": q.dimension, "agree_pole": q.agree_pole} for q in questions],
-        answer_map,
-    )
     dims = scoring["dimensions"]
 
-    boundary_notes: list[str] = []
-    for d in ["EI", "SN", "TF", "JP"]:
-        fp = int(dims[d]["first_percent"])
-        sp = int(dims[d]["second_percent"])
-        if is_near_boundary(fp, threshold_gap_percent=10):
-            boundary_notes.append(f"{d} 接近边界（{dims[d]['first_pole']} {fp}% / {dims[d]['second_pole']} {sp}%）")
+    notes = boundary_notes(dims, threshold_gap_percent=10)
 
     delta = expiry_from_choice(share_expiry)
     now = datetime.now(timezone.utc)
@@ -609,20 +909,55 @@ def finish_submit(
     test_row.result_json = {
         "type": scoring["type"],
         "dimensions": dims,
-        "boundary_notes": boundary_notes,
+        "boundary_notes": notes,
     }
     test_row.status = "completed"
     test_row.completed_at = now
 
     db.commit()
+    _forget_test_token(request)
 
-    return RedirectResponse(url=f"/result/{share_token}", status_code=303)
+    # Start the deep report now so the result page finds it in flight (single-flight) or stored.
+    api_key = os.getenv("MBTI_AI_API_KEY")
+    if api_key and AsyncOpenAI is not None:
+        background_tasks.add_task(
+            _enqueue_report_pregeneration,
+            jobs,
+            session_factory,
+            llm,
+            errors,
+            test_row.id,
+            api_key=api_key,
+            base_url=os.getenv("MBTI_AI_BASE_URL", "https://api.siliconflow.cn/v1"),
+            model=os.getenv("MBTI_AI_MODEL", "deepseek-ai/DeepSeek-V3.2"),
+        )
 
+    response = RedirectResponse(url=f"/result/{share_token}", status_code=303)
+    # The result page reads from the replica, which may not have this commit yet.
+    pin_reads_to_primary(response)
+    return response
+
+
+class _CachedResult(NamedTuple):
+    type_code: str
+    dimensions: list[dict[str, Any]]
+    dimensions_json: str
+    report: dict[str, Any]
+    share_expires_at: datetime | None
+
+
+# Completed results never change, so the report context is cached per share token hash.
+_result_cache: TTLCache[str, _CachedResult] = TTLCache(
+    maxsize=int(os.getenv("MBTI_RESULT_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("MBTI_RESULT_CACHE_TTL_SECONDS", "600")),
+)
+
+
+def _load_shared_result(db: Session, token_hash: str) -> _CachedResult | None:
+    cached = _result_cache.get(token_hash)
+    if cached is not None:
+        return cached
 
-@router.get("/result/{share_token}", response_class=HTMLResponse)
-def result_page(request: Request, share_token: str, db: Session = Depends(get_db)):
-    secret = _app_secret()
-    token_hash = hash_token(share_token, secret=secret)
     test_row = (
         db.query(Test)
         .options(joinedload(Test.answers).joinedload(Answer.question))
@@ -630,10 +965,7 @@ def result_page(request: Request, share_token: str, db: Session = Depends(get_db
         .one_or_none()
     )
     if not test_row or test_row.status != "completed" or not test_row.result_json:
-        raise HTTPException(status_code=404, detail="结果不存在")
-
-    if test_row.share_expires_at and datetime.now(timezone.utc) > _as_utc(test_row.share_expires_at):
-        return templates.TemplateResponse(request, "result_expired.html", {"type_code": test_row.result_type})
+        return None
 
     result = dict(test_row.result_json)
     type_code = result.get("type") or test_row.result_type
@@ -647,14 +979,36 @@ def result_page(request: Request, share_token: str, db: Session = Depends(get_db
         answers=list(getattr(test_row, "answers", []) or []),
     )
 
+    entry = _CachedResult(
+        type_code=type_code,
+        dimensions=[dims.get(d) for d in ["EI", "SN", "TF", "JP"] if dims.get(d)],
+        dimensions_json=json.dumps(dims, ensure_ascii=False),
+        report=report,
+        share_expires_at=_as_utc(test_row.share_expires_at) if test_row.share_expires_at else None,
+    )
+    _result_cache.set(token_hash, entry)
+    return entry
+
+
+@router.get("/result/{share_token}", response_class=HTMLResponse)
+def result_page(request: Request, share_token: str, db: Session = Depends(get_read_db)):
+    secret = _app_secret()
+    token_hash = hash_token(share_token, secret=secret)
+    cached = _load_shared_result(db, token_hash)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="结果不存在")
+
+    if cached.share_expires_at and datetime.now(timezone.utc) > cached.share_expires_at:
+        return templates.TemplateResponse(request, "result_expired.html", {"type_code": cached.type_code})
+
     return templates.TemplateResponse(
         request,
         "result.html",
         {
-            "type_code": type_code,
-            "dimensions": [dims.get(d) for d in ["EI", "SN", "TF", "JP"] if dims.get(d)],
-            "dimensions_json": json.dumps(dims, ensure_ascii=False),
-            "report": report,
+            "type_code": cached.type_code,
+            "dimensions": cached.dimensions,
+            "dimensions_json": cached.dimensions_json,
+            "report": cached.report,
             "share_url": str(request.base_url)[:-1] + f"/result/{share_token}",
             "share_token": share_token,
             "result_ai_stream_url": str(request.url_for("result_ai_content", share_token=share_token)),
@@ -671,40 +1025,6 @@ def _clean_ai_markdown(md: str) -> str:
     return text.strip()
 
 
-def _stream_sanitize_markdown_chunks(chunks: object, *, carry_size: int = 96):
-    # Best-effort sanitizer that fixes headings even when whitespace/# are split across chunks.
-    # Keeps a small tail buffer to handle boundary cases.
-    tail = ""
-
-    async def _agen():
-        nonlocal tail
-        async for part in chunks:
-            s = str(part or "")
-            if not s:
-                continue
-            combined = tail + s
-            combined = combined.replace("TAGS_SHORT_READ_WARNING false", "").replace("TAGS_SHORT_READ_WARNING true", "")
-            # 1) Remove any leading whitespace before heading markers
-            combined = re.sub(r"(?m)^[ \t\uFE0F\u200B\u00A0\u3000]+(#{1,6})", r"\1", combined)
-            # 2) Normalize whitespace *after* hashes, including invisible unicode (VS16/ZWSP/NBSP)
-            combined = re.sub(r"(?m)^(#+)[ \t\uFE0F\u200B\u00A0\u3000]+", r"\1 ", combined)
-            # 3) Fix bold immediately after heading marker
-            combined = re.sub(r"(?m)(#{1,6} \\*\\*)[ \t\uFE0F\u200B\u00A0\u3000]+", r"\1", combined)
-
-            if len(combined) <= carry_size:
-                tail = combined
-                continue
-
-            emit = combined[:-carry_size]
-            tail = combined[-carry_size:]
-            yield emit
-
-        if tail:
-            yield tail
-
-    return _agen()
-
-
 def _markdown_to_html(md: str) -> str:
     # Escape raw HTML first to avoid injection, while keeping Markdown syntax intact.
     safe_md = html.escape(md or "")
@@ -716,132 +1036,73 @@ def _markdown_to_html(md: str) -> str:
         return markdown.markdown(safe_md)
 
 
-@router.api_route(
-    "/result/ai_content/{share_token}",
-    methods=["GET", "POST"],
-    response_class=HTMLResponse,
-    name="result_ai_content",
-)
-async def result_ai_content(request: Request, share_token: str, db: Session = Depends(get_db)):
-    raw_response_for_log = ""
+_AI_BUSY_MESSAGE = "AI 服务暂时繁忙，请稍后刷新重试"
 
-    def _log_ai_error(error: Exception, raw_response: str = "") -> None:
-        try:
-            db.add(
-                ErrorLog(
-                    error_type=type(error).__name__,
-                    error_msg=str(error),
-                    raw_response=raw_response or "Generation Failed",
-                )
-            )
-            db.commit()
-        except Exception:
-            db.rollback()
+# Bump when the deep-profile prompt changes so stored reports are regenerated.
+_DEEP_PROFILE_PROMPT_VERSION = "deep-profile-v1"
 
-    secret = _app_secret()
-    token_hash = hash_token(share_token, secret=secret)
-    test_row = (
-        db.query(Test)
-        .options(joinedload(Test.answers).joinedload(Answer.question))
-        .filter(Test.share_token_hash == token_hash)
-        .one_or_none()
+
+def _load_ai_report(db: Session, test_id: int) -> str | None:
+    return (
+        db.query(AiReport.content)
+        .filter(AiReport.test_id == test_id, AiReport.prompt_version == _DEEP_PROFILE_PROMPT_VERSION)
+        .scalar()
     )
-    if not test_row or test_row.status != "completed" or not test_row.result_json:
-        return StreamingResponse(
-            iter(["\n\n**⚠️ 结果不存在或已失效。**\n"]),
-            media_type="text/plain; charset=utf-8",
-            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
-        )
 
-    if test_row.share_expires_at and datetime.now(timezone.utc) > _as_utc(test_row.share_expires_at):
-        return StreamingResponse(
-            iter(["\n\n**⚠️ 分享链接已过期。**\n"]),
-            media_type="text/plain; charset=utf-8",
-            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+
+def _save_ai_report(db: Session, test_id: int, content: str, *, model: str | None) -> None:
+    if not content.strip():
+        return
+    try:
+        db.add(
+            AiReport(
+                test_id=test_id,
+                prompt_version=_DEEP_PROFILE_PROMPT_VERSION,
+                model=(model or "")[:100] or None,
+                content=content,
+            )
         )
+        db.commit()
+    except IntegrityError:
+        # Another viewer finished first; the unique constraint keeps their copy.
+        db.rollback()
 
-    result = test_row.result_json or {}
-    type_code = str(result.get("type") or test_row.result_type or "Unknown")
-    dims: dict[str, dict] = dict(result.get("dimensions") or {})
-    boundary_notes = list(result.get("boundary_notes") or [])
-    answers = list(getattr(test_row, "answers", []) or [])
-
-    def _dimensions_str() -> str:
-        parts: list[str] = []
-        for dim in ["EI", "SN", "TF", "JP"]:
-            info = dims.get(dim) or {}
-            fp = info.get("first_percent")
-            sp = info.get("second_percent")
-            first = info.get("first_pole")
-            second = info.get("second_pole")
-            if fp is None or sp is None or not first or not second:
-                continue
-            parts.append(f"{first}:{fp}% / {second}:{sp}%")
-        return ", ".join(parts) if parts else "维度数据缺失"
 
-    def _extremes_str() -> str:
-        items: list[str] = []
-        for idx, a in enumerate(answers, start=1):
-            try:
-                v = int(getattr(a, "value", 0))
-            except Exception:
-                continue
-            if v not in (1, 5):
-                continue
-            q = getattr(a, "question", None)
-            if not q:
-                continue
-            text = str(getattr(q, "text", "") or "").strip()
-            dim = str(getattr(q, "dimension", "") or "").strip()
-            agree = str(getattr(q, "agree_pole", "") or "").strip()
-            if len(dim) == 2 and len(agree) == 1:
-                opposite = dim[1] if dim[0] == agree else (dim[0] if dim[1] == agree else "?")
-            else:
-                opposite = "?"
-            pole = agree if v == 5 else opposite
-            snippet = text[:48] + ("…" if len(text) > 48 else "")
-            items.append(f"{idx}. [{dim}/{pole}向] {v}分：{snippet}")
-            if len(items) >= 6:
-                break
-        return "；".join(items) if items else "未发现明显的极值作答（1分/5分）"
-
-    insight_list = build_report_context(
-        type_code,
-        dims,
-        boundary_notes=boundary_notes,
-        answers=answers,
-    ).get("insights", [])
-    insight_list = [str(x).strip() for x in (insight_list or []) if str(x).strip()]
+def _join_chat_stream(
+    llm: LLMClientPool,
+    api_key: str,
+    base_url: str,
+    model: str,
+    messages: list[dict[str, str]],
+    *,
+    timeout: float,
+    priority: int,
+) -> Subscription:
+    # Identical prompts in flight at the same time share one upstream completion.
+    return llm_flights.join(
+        prompt_fingerprint(model, messages),
+        lambda: stream_chat_text(
+            llm.client(api_key, base_url),
+            model=model,
+            messages=messages,
+            timeout=timeout,
+            breaker=llm_breaker,
+        ),
+        priority=priority,
+    )
 
-    tags: list[str] = []
-    for dim, info in (dims or {}).items():
-        try:
-            gap = int(info.get("gap_percent"))
-        except Exception:
-            continue
-        if gap < 20:
-            tags.append(f"{dim}均衡")
-        elif gap > 60:
-            tags.append(f"{dim}极致")
-    if any(getattr(a, "value", None) == 5 for a in answers):
-        tags.append("立场坚定")
-    if any("尽管你整体偏向" in s for s in insight_list):
-        tags.append("反差发力")
-    tags = tags[:6]
-
-    dimensions_str = _dimensions_str()
-    extreme_traits = _extremes_str()
-    dynamic_insights = "；".join(insight_list[:3]) if insight_list else "暂无动态洞察"
-    dynamic_tags = "动态标签：" + (", ".join([f"[{t}]" for t in tags]) if tags else "[稳定作答]")
-
-    user_profile_context = f"""
-用户MBTI类型：{type_code}
-【维度数据】：{dimensions_str}
-【极值特质】：{extreme_traits}
-【行为标签】：{dynamic_tags}
-【动态洞察】：{dynamic_insights}
-请综合上述数据，忽略刻板印象，还原一个鲜活的人。
-""".strip()
+
+async def _replay_chunks(text: str, *, size: int = 32):
+    # Replays a stored report through the same streaming path the live generation uses.
+    for start in range(0, len(text), size):
+        yield text[start : start + size]
+        await asyncio.sleep(0)
+
+
+def _deep_profile_messages(db: Session, test_row: Test) -> list[dict[str, str]]:
+    profile = build_profile_context(db, test_row, prompt_version=_DEEP_PROFILE_PROMPT_VERSION)
+    type_code = profile.type_code
+    user_profile_context = profile.text
 
     system_prompt = f"""
 你是一位洞察人性幽暗与光辉的心理学大师，正在使用 DeepSeek-V3.2 模型进行深度侧写。
@@ -869,6 +1130,132 @@ async def result_ai_content(request: Request, share_token: str, db: Session = De
 
     user_prompt = f"我的 MBTI 类型是：{type_code}。请开始你的深度解读。"
 
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def _pregeneration_messages(db: Session, test_id: int) -> list[dict[str, str]] | None:
+    # None when there is nothing to generate: already stored, or the test has no result.
+    if _load_ai_report(db, test_id) is not None:
+        return None
+    test_row = db.get(Test, test_id)
+    if not test_row or test_row.status != "completed" or not test_row.result_json:
+        return None
+    return _deep_profile_messages(db, test_row)
+
+
+async def _pregenerate_ai_report(
+    session_factory: async_sessionmaker[AsyncSession],
+    llm: LLMClientPool,
+    errors: ErrorLogSink,
+    test_id: int,
+    *,
+    api_key: str,
+    base_url: str,
+    model: str,
+) -> None:
+    if llm_breaker.is_open():
+        return
+
+    async with session_factory() as s:
+        messages = await s.run_sync(_pregeneration_messages, test_id)
+    if messages is None:
+        return
+
+    pieces: list[str] = []
+    claimed = False
+    error: Exception | None = None
+    try:
+        async with _join_chat_stream(
+            llm, api_key, base_url, model, messages, timeout=60.0, priority=PRIORITY_BACKGROUND
+        ) as flight:
+            async for piece in flight:
+                pieces.append(piece)
+            claimed = flight.claim()
+    except Exception as e:
+        error = e
+
+    if error is not None:
+        if not isinstance(error, CircuitOpenError):
+            errors.record_exception(error, "".join(pieces) or "Pregeneration Failed")
+        return
+    if not claimed:
+        return
+
+    try:
+        async with session_factory() as s:
+            await s.run_sync(_save_ai_report, test_id, "".join(pieces), model=model)
+    except Exception as e:
+        errors.record_exception(e, "".join(pieces))
+
+
+async def _enqueue_report_pregeneration(
+    jobs: BackgroundJobQueue,
+    session_factory: async_sessionmaker[AsyncSession],
+    llm: LLMClientPool,
+    errors: ErrorLogSink,
+    test_id: int,
+    **kwargs: str,
+) -> None:
+    jobs.submit(lambda: _pregenerate_ai_report(session_factory, llm, errors, test_id, **kwargs))
+
+
+@router.api_route(
+    "/result/ai_content/{share_token}",
+    methods=["GET", "POST"],
+    response_class=HTMLResponse,
+    name="result_ai_content",
+)
+async def result_ai_content(
+    request: Request,
+    share_token: str,
+    db: AsyncSession = Depends(get_async_db),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_async_session_factory),
+    llm: LLMClientPool = Depends(get_llm_clients),
+    errors: ErrorLogSink = Depends(get_error_sink),
+):
+    raw_response_for_log = ""
+
+    def _log_ai_error(error: Exception, raw_response: str = "") -> None:
+        errors.record_exception(error, raw_response or "Generation Failed")
+
+    missing = StreamingResponse(
+        iter(["\n\n**⚠️ 结果不存在或已失效。**\n"]),
+        media_type="text/plain; charset=utf-8",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    entry = await db.run_sync(_share_token_entry, share_token)
+    if entry is None or entry.status != "completed":
+        return missing
+
+    if entry.expires_at and datetime.now(timezone.utc) > entry.expires_at:
+        return StreamingResponse(
+            iter(["\n\n**⚠️ 分享链接已过期。**\n"]),
+            media_type="text/plain; charset=utf-8",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    stored = await db.run_sync(_load_ai_report, entry.test_id)
+    if stored is not None:
+        await db.close()
+        return StreamingResponse(
+            sanitize_markdown_stream(_replay_chunks(stored)),
+            media_type="text/plain; charset=utf-8",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    test_row = await db.get(Test, entry.test_id)
+    if not test_row or not test_row.result_json:
+        return missing
+
+    messages = await db.run_sync(_deep_profile_messages, test_row)
+    test_id = test_row.id
+    # The request session would otherwise keep its connection until the stream ends (up to a minute
+    # of AI output); everything below works from `messages` and reopens a session only to persist.
+    await db.close()
+
     api_key = os.getenv("MBTI_AI_API_KEY")
     base_url = os.getenv("MBTI_AI_BASE_URL", "https://api.siliconflow.cn/v1")
     model = os.getenv("MBTI_AI_MODEL", "deepseek-ai/DeepSeek-V3.2")
@@ -883,54 +1270,41 @@ async def result_ai_content(request: Request, share_token: str, db: Session = De
         _log_ai_error(error)
         return JSONResponse({"error": "AI_GENERATION_FAILED", "message": "AI生成失败，请刷新页面重试"}, status_code=500)
 
+    if llm_breaker.is_open():
+        # Provider is failing: answer now instead of queueing for another timeout. Not logged.
+        return JSONResponse({"error": "AI_GENERATION_FAILED", "message": _AI_BUSY_MESSAGE}, status_code=503)
+
     async def generator_raw():
         nonlocal raw_response_for_log
 
-        client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        pieces: list[str] = []
         try:
-            stream = await client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                stream=True,
-                timeout=60.0,
-            )
-
-            async for chunk in stream:
-                if await request.is_disconnected():
-                    break
-                try:
-                    choices = getattr(chunk, "choices", None)
-                    if not choices:
-                        continue
-                    delta = getattr(choices[0], "delta", None)
-                    if not delta:
-                        continue
-                    content = getattr(delta, "content", None)
-                    if not content:
-                        continue
-                    piece = str(content)
+            async with _join_chat_stream(
+                llm, api_key, base_url, model, messages, timeout=60.0, priority=PRIORITY_INTERACTIVE
+            ) as flight:
+                async for piece in flight:
+                    if await request.is_disconnected():
+                        pieces = []
+                        break
                     if len(raw_response_for_log) < 20000:
                         raw_response_for_log += piece
+                    pieces.append(piece)
                     yield piece
-                except Exception:
-                    continue
+
+                # Only complete generations are stored; later views replay them.
+                if pieces and flight.claim():
+                    async with session_factory() as s:
+                        await s.run_sync(_save_ai_report, test_id, "".join(pieces), model=model)
         except Exception as e:
-            _log_ai_error(e, raw_response_for_log)
+            if not isinstance(e, CircuitOpenError):
+                _log_ai_error(e, raw_response_for_log)
             err = str(e).strip()
             if len(err) > 240:
                 err = err[:240] + "..."
             yield f"\n\n**❌ AI 生成失败**\n\n错误：{err}\n\nAI_GENERATION_FAILED\n"
-        finally:
-            try:
-                await client.close()
-            except Exception:
-                pass
 
     return StreamingResponse(
-        _stream_sanitize_markdown_chunks(generator_raw()),
+        sanitize_markdown_stream(generator_raw()),
         media_type="text/plain; charset=utf-8",
         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
@@ -1182,8 +1556,65 @@ def analysis_page_post(
     )
 
 
+# Cards depend only on (type, conflict pair, letter dims); dims are bucketed so nearby profiles share a card.
+# Bump the version when the card prompt changes.
+_CONTENT_CARD_PROMPT_VERSION = "card-v1"
+_CONTENT_CARD_BUCKET_PERCENT = max(1, int(os.getenv("MBTI_CONTENT_CARD_BUCKET_PERCENT", "5")))
+_content_card_cache: TTLCache[str, dict[str, Any]] = TTLCache(
+    maxsize=int(os.getenv("MBTI_CONTENT_CARD_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("MBTI_CONTENT_CARD_CACHE_TTL_SECONDS", "86400")),
+)
+
+
+def _content_card_key(
+    mbti_type: str,
+    letter_dims: dict[str, int],
+    conflict_pair: tuple[str, str],
+) -> tuple[str, dict[str, int]]:
+    step = _CONTENT_CARD_BUCKET_PERCENT
+    bucketed = {k: min(100, int(round(int(v) / step)) * step) for k, v in sorted(letter_dims.items())}
+    payload = json.dumps(
+        [_CONTENT_CARD_PROMPT_VERSION, mbti_type.upper(), list(conflict_pair), bucketed],
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest(), bucketed
+
+
+def _load_content_card(db: Session, key: str) -> dict[str, Any] | None:
+    cached = _content_card_cache.get(key)
+    if cached is not None:
+        return cached
+    stored = db.query(ContentCard.fun_data).filter(ContentCard.cache_key == key).scalar()
+    if stored is not None:
+        _content_card_cache.set(key, stored)
+    return stored
+
+
+def _store_content_card(db: Session, key: str, mbti_type: str, fun_data: dict[str, Any]) -> None:
+    _content_card_cache.set(key, fun_data)
+    try:
+        db.add(
+            ContentCard(
+                cache_key=key,
+                prompt_version=_CONTENT_CARD_PROMPT_VERSION,
+                mbti_type=mbti_type.upper()[:10],
+                fun_data=fun_data,
+            )
+        )
+        db.commit()
+    except Exception:
+        # A concurrent request stored the same card first.
+        db.rollback()
+
+
 @router.post("/analysis/content_card", response_class=HTMLResponse, name="analysis_card_content")
-async def analysis_card_content(request: Request, db: Session = Depends(get_db)):
+async def analysis_card_content(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_async_session_factory),
+    llm: LLMClientPool = Depends(get_llm_clients),
+    errors: ErrorLogSink = Depends(get_error_sink),
+):
     try:
         body = await request.json()
         data = body if isinstance(body, dict) else {}
@@ -1220,9 +1651,33 @@ async def analysis_card_content(request: Request, db: Session = Depends(get_db))
 
     core = _analysis_core(mbti_type, dimensions_json)
     conflict_pair = core["conflict_pair"]
-    val1 = int(core["val1"])
-    val2 = int(core["val2"])
-    letter_dims = core["letter_dims"]
+    card_key, letter_dims = _content_card_key(mbti_type, core["letter_dims"], conflict_pair)
+    # The prompt sees the bucketed values so the cached card is a pure function of its key.
+    val1 = int(letter_dims[conflict_pair[0]])
+    val2 = int(letter_dims[conflict_pair[1]])
+
+    def _render_card(fun_data: dict[str, Any]):
+        return templates.TemplateResponse(
+            request,
+            "partials/analysis_content.html",
+            {
+                "fun_data": fun_data,
+                "conflict_pair": f"{conflict_pair[0]} vs {conflict_pair[1]}",
+                "war_left_pole": core["war_left_pole"],
+                "war_left_percent": int(core["war_left_percent"]),
+                "war_right_pole": core["war_right_pole"],
+                "war_right_percent": int(core["war_right_percent"]),
+            },
+        )
+
+    cached_card = await db.run_sync(_load_content_card, card_key)
+    # Don't hold a pooled connection through the LLM call; the card is stored from a new session.
+    await db.close()
+    if cached_card is not None:
+        return _render_card(cached_card)
+
+    if llm_breaker.is_open():
+        return _render_card(get_fallback_data(_AI_BUSY_MESSAGE))
 
     prompt = f"""
 用户MBTI: {mbti_type}
@@ -1279,9 +1734,8 @@ async def analysis_card_content(request: Request, db: Session = Depends(get_db))
         base_url = os.getenv("MBTI_AI_BASE_URL", "https://api.siliconflow.cn/v1")
         model = os.getenv("MBTI_AI_MODEL", "deepseek-ai/DeepSeek-V3.2")
 
-        client = AsyncOpenAI(api_key=api_key, base_url=base_url)
-        try:
-            resp = await client.chat.completions.create(
+        async with llm_breaker.guard(), llm_scheduler.slot(PRIORITY_CARD):
+            resp = await llm.client(api_key, base_url).chat.completions.create(
                 model=model,
                 messages=[
                     {"role": "system", "content": "你必须只输出纯 JSON。"},
@@ -1290,11 +1744,6 @@ async def analysis_card_content(request: Request, db: Session = Depends(get_db))
                 stream=False,
                 timeout=60.0,
             )
-        finally:
-            try:
-                await client.close()
-            except Exception:
-                pass
 
         content = ""
         try:
@@ -1321,13 +1770,7 @@ async def analysis_card_content(request: Request, db: Session = Depends(get_db))
                     raise ValueError("AI 未返回可解析的 JSON 对象")
                 fun_data_obj = repair_json(extracted, return_objects=True)
         except Exception as parse_error:
-            error_log = ErrorLog(
-                error_type=type(parse_error).__name__,
-                error_msg=str(parse_error),
-                raw_response=raw_content_for_log,
-            )
-            db.add(error_log)
-            db.commit()
+            errors.record_exception(parse_error, raw_content_for_log)
             return JSONResponse(
                 {
                     "error": "AI_GENERATION_FAILED",
@@ -1400,14 +1843,12 @@ async def analysis_card_content(request: Request, db: Session = Depends(get_db))
         # ---------------------------------------------------------------
 
         fun_data = fun_data_obj
+        async with session_factory() as s:
+            await s.run_sync(_store_content_card, card_key, mbti_type, fun_data)
+    except CircuitOpenError:
+        return _render_card(get_fallback_data(_AI_BUSY_MESSAGE))
     except Exception as e:
-        error_log = ErrorLog(
-            error_type=type(e).__name__,
-            error_msg=str(e),
-            raw_response=raw_content_for_log,
-        )
-        db.add(error_log)
-        db.commit()
+        errors.record_exception(e, raw_content_for_log)
         return JSONResponse(
             {
                 "error": "AI_GENERATION_FAILED",
@@ -1416,24 +1857,14 @@ async def analysis_card_content(request: Request, db: Session = Depends(get_db))
             status_code=500,
         )
 
-    return templates.TemplateResponse(
-        request,
-        "partials/analysis_content.html",
-        {
-            "fun_data": fun_data,
-            "conflict_pair": f"{conflict_pair[0]} vs {conflict_pair[1]}",
-            "war_left_pole": core["war_left_pole"],
-            "war_left_percent": int(core["war_left_percent"]),
-            "war_right_pole": core["war_right_pole"],
-            "war_right_percent": int(core["war_right_percent"]),
-        },
-    )
+    return _render_card(fun_data)
 
 
 @router.api_route("/analysis/content", methods=["GET", "POST"], response_class=HTMLResponse, name="analysis_async_content")
 async def analysis_async_content(
     request: Request,
     db: Session = Depends(get_db),
+    llm: LLMClientPool = Depends(get_llm_clients),
     type_code: str = Query("", alias="type"),
     dimensions: str | None = Query(None),
 ):
@@ -1499,45 +1930,27 @@ async def analysis_async_content(
         if AsyncOpenAI is None:
             yield "\n\n**❌ AI 生成失败**\n\n错误：OpenAI SDK 不可用\n"
             return
+        if llm_breaker.is_open():
+            yield f"\n\n**❌ AI 生成失败**\n\n错误：{_AI_BUSY_MESSAGE}\n"
+            return
 
-        client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        messages = [
+            {"role": "system", "content": "You output Markdown only."},
+            {"role": "user", "content": prompt},
+        ]
         try:
-            stream = await client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You output Markdown only."},
-                    {"role": "user", "content": prompt},
-                ],
-                stream=True,
-                timeout=60.0,
-            )
-
-            async for chunk in stream:
-                if await request.is_disconnected():
-                    break
-                try:
-                    choices = getattr(chunk, "choices", None)
-                    if not choices:
-                        continue
-                    delta = getattr(choices[0], "delta", None)
-                    if not delta:
-                        continue
-                    content = getattr(delta, "content", None)
-                    if not content:
-                        continue
-                    yield str(content)
-                except Exception:
-                    continue
+            async with _join_chat_stream(
+                llm, api_key, base_url, model, messages, timeout=60.0, priority=PRIORITY_CARD
+            ) as flight:
+                async for piece in flight:
+                    if await request.is_disconnected():
+                        break
+                    yield piece
         except Exception as e:
             err = str(e).strip()
             if len(err) > 240:
                 err = err[:240] + "..."
             yield f"\n\n**❌ AI 生成失败**\n\n错误：{err}\n"
-        finally:
-            try:
-                await client.close()
-            except Exception:
-                pass
 
     return StreamingResponse(
         generator(),
@@ -1547,42 +1960,33 @@ async def analysis_async_content(
 
 
 @router.get("/result/ai_stream/{share_token}")
-async def ai_stream(request: Request, share_token: str, db: Session = Depends(get_db)):
+async def ai_stream(
+    request: Request,
+    share_token: str,
+    db: AsyncSession = Depends(get_async_db),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_async_session_factory),
+    llm: LLMClientPool = Depends(get_llm_clients),
+):
     # 最终整合版：灵魂侧写提示词 + 累加流式输出 + 防重连
     async def event_generator():
-        client = None
-
         # 1) 防无限重连：断开后等待 24 小时再重连
         yield "retry: 86400000\n\n"
 
         try:
-            def local_app_secret() -> str:
-                # 兼容历史命名：优先 MBTI_APP_SECRET，其次 APP_SECRET
-                return os.getenv("MBTI_APP_SECRET") or os.getenv("APP_SECRET", "secret")
-
-            def local_hash_token(token: str, secret: str) -> str:
-                # 与 app.services.tokens.hash_token 一致：sha256(secret + token)
-                digest = hashlib.sha256()
-                digest.update(secret.encode("utf-8"))
-                digest.update(token.encode("utf-8"))
-                return digest.hexdigest()
-
             yield "data: [阶段1] 连接已建立，开始验证...\n\n"
 
-            secret = local_app_secret()
-            token_hash = local_hash_token(share_token, secret)
-            test_row = (
-                db.query(Test)
-                .options(joinedload(Test.answers).joinedload(Answer.question))
-                .filter(Test.share_token_hash == token_hash)
-                .first()
-            )
-            if not test_row:
+            entry = await db.run_sync(_share_token_entry, share_token)
+            if entry is None:
                 yield "data: <span class='text-red-500'>⚠️ 链接已失效，无法获取测试记录。</span>\n\n"
                 return
 
-            result = test_row.result_json or {}
-            type_code = result.get("type", "Unknown")
+            stored = await db.run_sync(_load_ai_report, entry.test_id)
+            if stored is not None:
+                await db.close()
+                yield "data: [阶段3] 已有分析结果，开始输出...\n\n"
+                async for piece in _replay_chunks(stored):
+                    yield f"data: {json.dumps(piece)}\n\n"
+                return
 
             base_url = os.getenv("MBTI_AI_BASE_URL", "https://api.siliconflow.cn/v1")
             api_key = os.getenv("MBTI_AI_API_KEY")
@@ -1596,164 +2000,45 @@ async def ai_stream(request: Request, share_token: str, db: Session = Depends(ge
                 yield "data: <span class='text-red-500'>❌ 系统错误: OpenAI SDK 不可用</span>\n\n"
                 return
 
-            yield f"data: [阶段2] 准备请求 AI（{html.escape(str(model))}）...\n\n"
-            client = AsyncOpenAI(api_key=api_key, base_url=base_url)
-
-            # --- 构建“全息画像”数据 ---
-            dims: dict[str, dict] = dict(result.get("dimensions") or {})
-            boundary_notes = list(result.get("boundary_notes") or [])
-
-            def _dimensions_str() -> str:
-                parts: list[str] = []
-                for dim in ["EI", "SN", "TF", "JP"]:
-                    info = dims.get(dim) or {}
-                    fp = info.get("first_percent")
-                    sp = info.get("second_percent")
-                    first = info.get("first_pole")
-                    second = info.get("second_pole")
-                    if first and second and fp is not None and sp is not None:
-                        parts.append(f"{first}:{int(fp)}% / {second}:{int(sp)}%")
-                return ", ".join(parts) if parts else "暂无维度百分比数据"
-
-            def _extremes_str() -> str:
-                items: list[str] = []
-                for idx, a in enumerate(list(getattr(test_row, "answers", []) or []), start=1):
-                    try:
-                        v = int(getattr(a, "value", 0))
-                    except Exception:
-                        continue
-                    if v not in (1, 5):
-                        continue
-                    q = getattr(a, "question", None)
-                    if not q:
-                        continue
-                    text = str(getattr(q, "text", "") or "").strip()
-                    dim = str(getattr(q, "dimension", "") or "").strip()
-                    agree = str(getattr(q, "agree_pole", "") or "").strip()
-                    if len(dim) == 2 and len(agree) == 1:
-                        opposite = dim[1] if dim[0] == agree else (dim[0] if dim[1] == agree else "?")
-                    else:
-                        opposite = "?"
-                    pole = agree if v == 5 else opposite
-                    snippet = text[:48] + ("…" if len(text) > 48 else "")
-                    items.append(f"{idx}. [{dim}/{pole}向] {v}分：{snippet}")
-                    if len(items) >= 6:
-                        break
-                return "；".join(items) if items else "未发现明显的极值作答（1分/5分）"
-
-            answers = list(getattr(test_row, "answers", []) or [])
-            insight_list = build_report_context(
-                type_code,
-                dims,
-                boundary_notes=boundary_notes,
-                answers=answers,
-            ).get("insights", [])
-            insight_list = [str(x).strip() for x in (insight_list or []) if str(x).strip()]
-
-            tags: list[str] = []
-            for dim, info in (dims or {}).items():
-                try:
-                    gap = int(info.get("gap_percent"))
-                except Exception:
-                    continue
-                if gap < 20:
-                    tags.append(f"{dim}均衡")
-                elif gap > 60:
-                    tags.append(f"{dim}极致")
-            if any(getattr(a, "value", None) == 5 for a in answers):
-                tags.append("立场坚定")
-            if any("尽管你整体偏向" in s for s in insight_list):
-                tags.append("反差发力")
-            tags = tags[:6]
-
-            dimensions_str = _dimensions_str()
-            extreme_traits = _extremes_str()
-            dynamic_insights = "；".join(insight_list[:3]) if insight_list else "暂无动态洞察"
-            dynamic_tags = "动态标签：" + (", ".join([f"[{t}]" for t in tags]) if tags else "[稳定作答]")
-
-            user_profile_context = f"""
-用户MBTI类型：{type_code}
-【维度数据】：{dimensions_str}
-【极值特质】：{extreme_traits}
-【行为标签】：{dynamic_tags}
-【动态洞察】：{dynamic_insights}
-请综合上述数据，忽略刻板印象，还原一个鲜活的人。
-""".strip()
-
-            # --- 提示词升级：方案 A「深渊凝视者」(格式对齐 + 重点加粗) ---
-            system_prompt = f"""
-你是一位洞察人性幽暗与光辉的心理学大师，正在使用 DeepSeek-V3.2 模型进行深度侧写。
-{user_profile_context}
-
-【指令】
-1. 你的语言要像手术刀一样精准，剥开用户的社会面具，直指内心深处的矛盾与渴望。
-2. 结合给出的维度数据和极值特质进行推理，不要只罗列优缺点。
-3. 严禁输出任何开场白，严禁使用代码块。
-4. 【排版严格要求】：
-   - 所有标题（###）必须**顶格书写**，严禁在前面加空格，确保左对齐。
-   - **关键格式**：标题的井号与文字之间**只能有一个空格**（例如 `### 标题`），严禁出现两个空格或全角空格。
-   - 请务必使用 Markdown 加粗语法（如 **关键特质**）高亮文中那些直击灵魂、反直觉或最具冲击力的短句，每段至少包含 1-2 处高亮。
-
-【输出模版】
-### ️ 灵魂底色
-(用一个带有灰度色彩的意象，如“**暴风雨中的灯塔**”，描述该人格最底层的核心驱动力。约 100 字)
-
-###  镜像与阴影
-(指出用户常常欺骗自己的一点，以及外界误解最深的一点。用“世人皆以为...，殊不知...”的句式。约 150 字)
-
-###  给伤口的诗
-(针对该人格最容易受挫的软肋，写一段治愈且充满力量的短句。约 80 字)
-""".strip()
-
-            user_prompt = f"我的 MBTI 类型是：{type_code}。请开始你的深度解读。"
-
-            stream = await client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                stream=True,
-                timeout=60.0,
-            )
+            if llm_breaker.is_open():
+                yield f"data: ⚠️ {_AI_BUSY_MESSAGE}。\n\n"
+                return
 
-            yield "data: [阶段3] AI 已接通，开始输出...\n\n"
+            yield f"data: [阶段2] 准备请求 AI（{html.escape(str(model))}）...\n\n"
 
-            async for chunk in stream:
-                try:
-                    choices = getattr(chunk, "choices", None)
-                    if not choices:
-                        continue
-                    delta = getattr(choices[0], "delta", None)
-                    if not delta:
-                        continue
-                    content = getattr(delta, "content", None)
-                    if not content:
-                        continue
-                    safe_payload = json.dumps(str(content))
-                    yield f"data: {safe_payload}\n\n"
-                except Exception as loop_err:
-                    # 忽略单个 token 的异常，避免流整体中断
-                    print(f"AI stream chunk error: {loop_err}")
-                    continue
+            test_row = await db.get(Test, entry.test_id)
+            if not test_row:
+                yield "data: <span class='text-red-500'>⚠️ 链接已失效，无法获取测试记录。</span>\n\n"
+                return
+            messages = await db.run_sync(_deep_profile_messages, test_row)
+            test_id = test_row.id
+            # Don't hold a pooled connection for the length of the AI stream.
+            await db.close()
+            async with _join_chat_stream(
+                llm, api_key, base_url, model, messages, timeout=60.0, priority=PRIORITY_INTERACTIVE
+            ) as flight:
+                yield "data: [阶段3] AI 已接通，开始输出...\n\n"
+
+                pieces: list[str] = []
+                async for piece in flight:
+                    pieces.append(piece)
+                    yield f"data: {json.dumps(piece)}\n\n"
+
+                if flight.claim():
+                    async with session_factory() as s:
+                        await s.run_sync(_save_ai_report, test_id, "".join(pieces), model=model)
 
         except Exception as e:
             err_msg = str(e)
             print(f"AI Stream Error: {traceback.format_exc()}")
             yield f"data: {json.dumps('❌ 分析中断: ' + err_msg)}\n\n"
-        finally:
-            if client:
-                try:
-                    await client.close()
-                except Exception:
-                    pass
 
     headers = {"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"}
     return StreamingResponse(event_generator(), media_type="text/event-stream", headers=headers)
 
 
 @router.post("/submit_feedback", response_class=JSONResponse)
-async def submit_feedback(request: Request, db: Session = Depends(get_db)):
+async def submit_feedback(request: Request, db: AsyncSession = Depends(get_async_db)):
     try:
         payload = await request.json()
         data = payload if isinstance(payload, dict) else {}
@@ -1785,7 +2070,8 @@ async def submit_feedback(request: Request, db: Session = Depends(get_db)):
         mbti_type=mbti_type,
     )
     db.add(feedback)
-    db.commit()
+    await db.run_sync(bump_counters, {FEEDBACK_COUNT: 1, FEEDBACK_RATING_SUM: rating})
+    await db.commit()
 
     return JSONResponse({"message": "感谢您的反馈！"}, status_code=200)
 
@@ -1794,22 +2080,23 @@ async def submit_feedback(request: Request, db: Session = Depends(get_db)):
 async def admin_dashboard(
     request: Request,
     key: str | None = Query(None),
-    page_feedback: int = Query(1, ge=1),
-    page_error: int = Query(1, ge=1),
-    db: Session = Depends(get_db),
+    feedback_after: str | None = Query(None),
+    feedback_before: str | None = Query(None),
+    error_after: str | None = Query(None),
+    error_before: str | None = Query(None),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     if key != "jackson_admin":
         return HTMLResponse("403 Forbidden: 访问被拒绝，请核对密钥。", status_code=403)
 
-    feedback_query = db.query(Feedback).order_by(Feedback.created_at.desc())
-    error_query = db.query(ErrorLog).order_by(ErrorLog.created_at.desc())
-
-    feedbacks = _paginate_query(feedback_query, page_feedback, per_page=5)
-    error_logs = _paginate_query(error_query, page_error, per_page=5)
+    counts = await db.run_sync(read_counters, (FEEDBACK_COUNT, FEEDBACK_RATING_SUM, ERROR_LOG_COUNT))
+    feedbacks = await _keyset_page(
+        db, Feedback, total=counts[FEEDBACK_COUNT], after=feedback_after, before=feedback_before
+    )
+    error_logs = await _keyset_page(db, ErrorLog, total=counts[ERROR_LOG_COUNT], after=error_after, before=error_before)
 
-    total_count = int(db.query(func.count(Feedback.id)).scalar() or 0)
-    avg_result = db.query(func.avg(Feedback.rating)).scalar()
-    avg_rating = round(float(avg_result), 1) if avg_result is not None else 0.0
+    total_count = counts[FEEDBACK_COUNT]
+    avg_rating = round(counts[FEEDBACK_RATING_SUM] / total_count, 1) if total_count else 0.0
 
     return templates.TemplateResponse(
         request,
@@ -1820,74 +2107,88 @@ async def admin_dashboard(
             "total_count": total_count,
             "avg_rating": avg_rating,
             "timedelta": timedelta,
-            "page_feedback": feedbacks.page,
-            "page_error": error_logs.page,
+            "dashboard_link": partial(_dashboard_link, request),
         },
     )
 
 
 @router.delete("/admin/delete_feedback/{feedback_id}", response_class=JSONResponse)
-async def delete_feedback(feedback_id: int, key: str | None = Query(None), db: Session = Depends(get_db)):
+async def delete_feedback(feedback_id: int, key: str | None = Query(None), db: AsyncSession = Depends(get_async_db)):
     if key != "jackson_admin":
         return JSONResponse({"error": "无权操作"}, status_code=403)
 
-    feedback = db.query(Feedback).filter(Feedback.id == feedback_id).one_or_none()
-    if feedback is None:
+    # Counters move by what this statement removed, so a repeated delete of the same row is a no-op.
+    removed = (
+        await db.execute(delete(Feedback).where(Feedback.id == feedback_id).returning(Feedback.rating))
+    ).scalars().all()
+    if not removed:
+        await db.rollback()
         return JSONResponse({"error": "反馈不存在"}, status_code=404)
 
-    db.delete(feedback)
-    db.commit()
-    return JSONResponse({"success": True, "message": "删除成功"}, status_code=200)
+    await db.run_sync(bump_counters, {FEEDBACK_COUNT: -len(removed), FEEDBACK_RATING_SUM: -sum(removed)})
+    await db.commit()
+    response = JSONResponse({"success": True, "message": "删除成功"}, status_code=200)
+    pin_reads_to_primary(response)  # the dashboard reloads right after
+    return response
 
 
 @router.api_route("/admin/error_log/{log_id}/delete", methods=["POST", "DELETE"], response_class=JSONResponse)
-async def delete_error_log(log_id: int, key: str | None = Query(None), db: Session = Depends(get_db)):
+async def delete_error_log(log_id: int, key: str | None = Query(None), db: AsyncSession = Depends(get_async_db)):
     if key != "jackson_admin":
         return JSONResponse({"error": "无权操作"}, status_code=403)
 
-    log_item = db.query(ErrorLog).filter(ErrorLog.id == log_id).one_or_none()
-    if log_item is None:
+    removed = (await db.execute(delete(ErrorLog).where(ErrorLog.id == log_id))).rowcount
+    if not removed:
+        await db.rollback()
         return JSONResponse({"error": "日志不存在"}, status_code=404)
 
-    db.delete(log_item)
-    db.commit()
-    return JSONResponse({"success": True}, status_code=200)
+    await db.run_sync(bump_counters, {ERROR_LOG_COUNT: -removed})
+    await db.commit()
+    response = JSONResponse({"success": True}, status_code=200)
+    pin_reads_to_primary(response)
+    return response
 
 
 @router.post("/admin/feedbacks/clear", response_class=JSONResponse)
-async def clear_feedbacks(key: str | None = Query(None), db: Session = Depends(get_db)):
+async def clear_feedbacks(key: str | None = Query(None), db: AsyncSession = Depends(get_async_db)):
     if key != "jackson_admin":
         return JSONResponse({"success": False, "message": "无权操作"}, status_code=403)
 
     try:
-        db.query(Feedback).delete(synchronize_session=False)
-        db.commit()
-        return JSONResponse({"success": True}, status_code=200)
+        await db.execute(delete(Feedback))
+        await db.run_sync(reset_counters, (FEEDBACK_COUNT, FEEDBACK_RATING_SUM))
+        await db.commit()
+        response = JSONResponse({"success": True}, status_code=200)
+        pin_reads_to_primary(response)
+        return response
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return JSONResponse({"success": False, "message": str(e)}, status_code=500)
 
 
 @router.post("/admin/error_logs/clear", response_class=JSONResponse)
-async def clear_error_logs(key: str | None = Query(None), db: Session = Depends(get_db)):
+async def clear_error_logs(key: str | None = Query(None), db: AsyncSession = Depends(get_async_db)):
     if key != "jackson_admin":
         return JSONResponse({"success": False, "message": "无权操作"}, status_code=403)
 
     try:
-        db.query(ErrorLog).delete(synchronize_session=False)
-        db.commit()
-        return JSONResponse({"success": True}, status_code=200)
+        await db.execute(delete(ErrorLog))
+        await db.run_sync(reset_counters, (ERROR_LOG_COUNT,))
+        await db.commit()
+        response = JSONResponse({"success": True}, status_code=200)
+        pin_reads_to_primary(response)
+        return response
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return JSONResponse({"success": False, "message": str(e)}, status_code=500)
 
 
 @router.get("/admin/export_feedbacks")
-async def export_feedbacks(key: str | None = Query(None), db: Session = Depends(get_db)):
+async def export_feedbacks(key: str | None = Query(None), db: AsyncSession = Depends(get_async_read_db)):
     if key != "jackson_admin":
         return HTMLResponse("403 Forbidden", status_code=403)
 
-    feedbacks = db.query(Feedback).order_by(Feedback.created_at.desc()).all()
+    feedbacks = (await db.scalars(select(Feedback).order_by(Feedback.created_at.desc()))).all()
 
     workbook = Workbook()
     worksheet = workbook.active
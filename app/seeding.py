@@ -8,6 +8,7 @@ from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from app.models import Question
+from app.services.question_bank import invalidate_question_bank
 
 
 _DEFAULT_SEED_PATH = Path(__file__).resolve().parent / "data" / "seed_questions.json"
@@ -44,5 +45,7 @@ def seed_questions_if_empty(db: Session, *, seed_path: Path | None = None) -> in
         inserted += 1
 
     db.commit()
+    if inserted:
+        invalidate_question_bank()
     return inserted
 
@@ -4,6 +4,8 @@ import html
 import os
 from typing import AsyncIterator
 
+from app.services.llm import LLMClientPool
+
 
 def _sse_data(text: str) -> str:
     safe = html.escape(text)
@@ -19,9 +21,17 @@ def _retry_ms(ms: int) -> str:
     return f"retry: {int(ms)}\n\n"
 
 
-async def generate_report_stream(user_type: str, insights: list[str]) -> AsyncIterator[str]:
+async def generate_report_stream(
+    user_type: str,
+    insights: list[str],
+    *,
+    clients: LLMClientPool | None = None,
+) -> AsyncIterator[str]:
     yield _oob_inner_html("ai-content", "<div class='muted'>✨ 正在连接 AI 咨询师...</div>")
 
+    # Callers inside a request pass the app-wide pool (see get_llm_clients); a throwaway one otherwise.
+    owned = clients is None
+    pool = LLMClientPool() if owned else clients
     try:
         base_url = os.getenv("MBTI_AI_BASE_URL")
         api_key = os.getenv("MBTI_AI_API_KEY")
@@ -30,9 +40,7 @@ async def generate_report_stream(user_type: str, insights: list[str]) -> AsyncIt
         if not base_url or not api_key:
             raise ValueError("Vercel 环境变量未配置 (MBTI_AI_BASE_URL 或 MBTI_AI_API_KEY)")
 
-        from openai import AsyncOpenAI
-
-        client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        client = pool.client(api_key, base_url)
 
         insight_text = "\n".join([f"- {i}" for i in (insights or [])])
         system_prompt = (
@@ -72,6 +80,9 @@ async def generate_report_stream(user_type: str, insights: list[str]) -> AsyncIt
         yield _oob_inner_html("ai-content", f"<div class='muted btn danger'>{html.escape(error_msg)}</div>")
         yield _retry_ms(86_400_000)
         return
+    finally:
+        if owned:
+            await pool.aclose()
 
     # 正常结束：把重连间隔拉长，避免 HTMX/EventSource 反复重连触发重复生成
     yield _retry_ms(86_400_000)
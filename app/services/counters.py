@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+
+from sqlalchemy import Select, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db import RoutingSession
+from app.models import ErrorLog, Feedback, TableCounter
+
+FEEDBACK_COUNT = "feedback.count"
+FEEDBACK_RATING_SUM = "feedback.rating_sum"
+ERROR_LOG_COUNT = "error_logs.count"
+
+# How to compute each counter exactly; used once, when a counter row does not exist yet.
+_SOURCES: dict[str, Callable[[], Select]] = {
+    FEEDBACK_COUNT: lambda: select(func.count(Feedback.id)),
+    FEEDBACK_RATING_SUM: lambda: select(func.coalesce(func.sum(Feedback.rating), 0)),
+    ERROR_LOG_COUNT: lambda: select(func.count(ErrorLog.id)),
+}
+
+
+def bump_counters(db: Session, deltas: dict[str, int]) -> None:
+    # Call in the transaction that inserts or deletes the rows. A counter that has not been seeded yet
+    # is left alone: seeding counts the table, which already includes this write.
+    for name, delta in deltas.items():
+        if delta:
+            db.execute(update(TableCounter).where(TableCounter.name == name).values(value=TableCounter.value + delta))
+
+
+def reset_counters(db: Session, names: Iterable[str]) -> None:
+    db.execute(update(TableCounter).where(TableCounter.name.in_(list(names))).values(value=0))
+
+
+def read_counters(db: Session, names: Iterable[str]) -> dict[str, int]:
+    names = list(names)
+    values = {
+        name: int(value)
+        for name, value in db.execute(
+            select(TableCounter.name, TableCounter.value).where(TableCounter.name.in_(names))
+        ).all()
+    }
+    missing = [name for name in names if name not in values]
+    if not missing:
+        return values
+
+    # First read after deploy: count once and store the result.
+    if isinstance(db, RoutingSession):
+        db.use_primary = True  # count on the primary, not a lagging replica
+    for name in missing:
+        values[name] = int(db.scalar(_SOURCES[name]()) or 0)
+        db.add(TableCounter(name=name, value=values[name]))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request seeded them first; its rows are just as good.
+        db.rollback()
+    return values
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import traceback
+from dataclasses import dataclass
+from datetime import datetime
+
+from fastapi import Request
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.models import ErrorLog, utc_now
+from app.services.counters import ERROR_LOG_COUNT, bump_counters
+
+
+_FLUSH_SECONDS = float(os.getenv("MBTI_ERROR_LOG_FLUSH_SECONDS", "2"))
+_BATCH_SIZE = int(os.getenv("MBTI_ERROR_LOG_BATCH_SIZE", "50"))
+_RAW_LIMIT = int(os.getenv("MBTI_ERROR_LOG_RAW_LIMIT", "4000"))
+
+
+@dataclass
+class _Pending:
+    error_type: str
+    error_msg: str
+    raw_response: str
+    first_seen: datetime
+    count: int = 1
+
+
+def _truncate(raw: str, limit: int) -> str:
+    if limit <= 0 or len(raw) <= limit:
+        return raw
+    return raw[:limit] + f"\n…[已截断，原长 {len(raw)} 字符]"
+
+
+class ErrorLogSink:
+    # Buffers error_logs rows in memory and writes them in one commit per flush.
+    # Identical (type, message) pairs within a flush window become a single row with a count;
+    # only the first raw response is kept, truncated to `raw_limit` characters.
+
+    def __init__(
+        self,
+        session_factory: sessionmaker[Session],
+        *,
+        flush_seconds: float = _FLUSH_SECONDS,
+        batch_size: int = _BATCH_SIZE,
+        raw_limit: int = _RAW_LIMIT,
+    ) -> None:
+        self.session_factory = session_factory
+        self.flush_seconds = max(0.01, float(flush_seconds))
+        self.batch_size = max(1, int(batch_size))
+        self.raw_limit = int(raw_limit)
+        self._lock = threading.Lock()
+        self._pending: dict[tuple[str, str], _Pending] = {}
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task[None] | None = None
+        self.recorded = 0
+        self.written = 0
+
+    def record(self, error_type: str, error_msg: str, raw_response: str = "") -> None:
+        key = (str(error_type or "")[:50], str(error_msg or ""))
+        with self._lock:
+            self.recorded += 1
+            entry = self._pending.get(key)
+            if entry is not None:
+                entry.count += 1
+            else:
+                self._pending[key] = _Pending(
+                    key[0], key[1], _truncate(str(raw_response or ""), self.raw_limit), utc_now()
+                )
+            full = len(self._pending) >= self.batch_size
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop to flush from (scripts, sync callers): write straight away.
+            self._write(self._take())
+            return
+        self._start()
+        if full:
+            self._wake.set()
+
+    def record_exception(self, error: BaseException, raw_response: str = "") -> None:
+        self.record(type(error).__name__, str(error), raw_response)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def _take(self) -> list[_Pending]:
+        with self._lock:
+            batch, self._pending = list(self._pending.values()), {}
+        return batch
+
+    def _write(self, batch: list[_Pending]) -> None:
+        if not batch:
+            return
+        db = self.session_factory()
+        try:
+            db.add_all(
+                [
+                    ErrorLog(
+                        error_type=e.error_type,
+                        error_msg=e.error_msg if e.count == 1 else f"{e.error_msg}\n[合并 {e.count} 条相同错误]",
+                        raw_response=e.raw_response,
+                        created_at=e.first_seen,
+                    )
+                    for e in batch
+                ]
+            )
+            bump_counters(db, {ERROR_LOG_COUNT: len(batch)})
+            db.commit()
+            self.written += len(batch)
+        except Exception:
+            db.rollback()
+            print(f"Error log flush failed: {traceback.format_exc()}")
+        finally:
+            db.close()
+
+    async def flush(self) -> None:
+        batch = self._take()
+        if batch:
+            await asyncio.to_thread(self._write, batch)
+
+    async def aclose(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+
+    def snapshot(self) -> dict[str, int]:
+        return {"pending": self.pending(), "recorded": self.recorded, "written": self.written}
+
+
+def get_error_sink(request: Request) -> ErrorLogSink:
+    # Created in the app lifespan and flushed when it ends.
+    return request.app.state.error_sink
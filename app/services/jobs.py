@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import traceback
+from collections.abc import Awaitable, Callable
+
+from fastapi import Request
+
+
+Job = Callable[[], Awaitable[None]]
+
+# AI report pre-generation started at finish time; 0 workers disables it.
+_REPORT_JOB_WORKERS = int(os.getenv("MBTI_AI_PREGENERATE_WORKERS", "2"))
+_REPORT_JOB_QUEUE_SIZE = int(os.getenv("MBTI_AI_PREGENERATE_QUEUE_SIZE", "100"))
+
+
+class BackgroundJobQueue:
+    # Bounded in-process queue drained by a fixed number of asyncio workers.
+    # Jobs are best effort: a full queue drops new work and nothing survives a restart.
+
+    def __init__(self, *, workers: int, maxsize: int) -> None:
+        self.workers = max(0, int(workers))
+        self._queue: asyncio.Queue[Job] = asyncio.Queue(maxsize=max(0, int(maxsize)))
+        self._tasks: list[asyncio.Task[None]] = []
+
+    def submit(self, job: Job) -> bool:
+        if self.workers <= 0:
+            return False
+        self._start()
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def _start(self) -> None:
+        self._tasks = [t for t in self._tasks if not t.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await job()
+            except Exception:
+                print(f"Background job failed: {traceback.format_exc()}")
+            finally:
+                self._queue.task_done()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def drain(self) -> None:
+        await self._queue.join()
+
+    async def aclose(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def create_report_jobs() -> BackgroundJobQueue:
+    return BackgroundJobQueue(workers=_REPORT_JOB_WORKERS, maxsize=_REPORT_JOB_QUEUE_SIZE)
+
+
+def get_report_jobs(request: Request) -> BackgroundJobQueue:
+    # Created in the app lifespan; the fallback covers apps mounted without it.
+    queue = getattr(request.app.state, "report_jobs", None)
+    if queue is None:
+        queue = create_report_jobs()
+        request.app.state.report_jobs = queue
+    return queue
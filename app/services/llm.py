@@ -0,0 +1,431 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import importlib.util
+import itertools
+import json
+import os
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+
+import httpx
+from fastapi import Request
+
+from app.services.metrics import Summary, register_collector
+
+try:
+    import openai
+except Exception:  # pragma: no cover
+    openai = None
+
+
+# Shared upstream connection pool; HTTP/2 is used when the optional h2 package is installed.
+_MAX_CONNECTIONS = int(os.getenv("MBTI_AI_MAX_CONNECTIONS", "100"))
+_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("MBTI_AI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("MBTI_AI_KEEPALIVE_EXPIRY_SECONDS", "60"))
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+# Upper bound on concurrent upstream completions for the whole process.
+_MAX_IN_FLIGHT = int(os.getenv("MBTI_AI_MAX_IN_FLIGHT", "16"))
+
+# Circuit breaker: this many upstream failures within the window opens the circuit for the cooldown.
+_BREAKER_FAILURES = int(os.getenv("MBTI_AI_BREAKER_FAILURES", "5"))
+_BREAKER_WINDOW_SECONDS = float(os.getenv("MBTI_AI_BREAKER_WINDOW_SECONDS", "60"))
+_BREAKER_COOLDOWN_SECONDS = float(os.getenv("MBTI_AI_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Lower value = served first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_CARD = 1
+PRIORITY_BACKGROUND = 2
+_PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_CARD: "card", PRIORITY_BACKGROUND: "background"}
+
+
+def prompt_fingerprint(model: str, messages: list[dict[str, str]], **params: Any) -> str:
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def iter_completion_text(stream: Any) -> AsyncIterator[str]:
+    # Text deltas of a streamed chat completion; malformed chunks are skipped.
+    async for chunk in stream:
+        try:
+            choices = getattr(chunk, "choices", None)
+            if not choices:
+                continue
+            delta = getattr(choices[0], "delta", None)
+            if not delta:
+                continue
+            content = getattr(delta, "content", None)
+            if not content:
+                continue
+            piece = str(content)
+        except Exception:
+            continue
+        yield piece
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    # closed -> open after `failure_threshold` failures within `window_seconds`;
+    # open -> half_open after `cooldown_seconds`, letting one trial call through;
+    # the trial closes the circuit on success and re-opens it on failure.
+
+    def __init__(
+        self,
+        *,
+        failure_threshold: int,
+        window_seconds: float,
+        cooldown_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.window_seconds = float(window_seconds)
+        self.cooldown_seconds = float(cooldown_seconds)
+        self._clock = clock
+        self._failures: deque[float] = deque()
+        self._opened_at: float | None = None
+        self._trial_running = False
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.cooldown_seconds:
+            return "half_open"
+        return "open"
+
+    def is_open(self) -> bool:
+        # True while calls would be rejected; cheap enough to check before queueing.
+        state = self.state
+        return state == "open" or (state == "half_open" and self._trial_running)
+
+    def _allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._trial_running = False
+        self._opened_at = None
+        self._failures.clear()
+
+    def record_failure(self) -> None:
+        now = self._clock()
+        if self._trial_running or self._opened_at is not None:
+            self._trial_running = False
+            self._opened_at = now
+            return
+        self._failures.append(now)
+        while self._failures and now - self._failures[0] > self.window_seconds:
+            self._failures.popleft()
+        if len(self._failures) >= self.failure_threshold:
+            self._opened_at = now
+            self._failures.clear()
+
+    @contextlib.asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        if not self._allow():
+            self.short_circuited += 1
+            raise CircuitOpenError("AI 服务暂时不可用（熔断中）")
+        try:
+            yield
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Cancelled / closed by the caller: says nothing about the provider.
+            self._trial_running = False
+            raise
+        else:
+            self.record_success()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "recent_failures": len(self._failures),
+            "short_circuited": self.short_circuited,
+        }
+
+
+async def stream_chat_text(
+    client: Any,
+    *,
+    model: str,
+    messages: list[dict[str, str]],
+    timeout: float,
+    breaker: CircuitBreaker | None = None,
+) -> AsyncIterator[str]:
+    async with breaker.guard() if breaker is not None else contextlib.nullcontext():
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            timeout=timeout,
+        )
+        async for piece in iter_completion_text(stream):
+            yield piece
+
+
+class LLMClientPool:
+    # One AsyncOpenAI per (api_key, base_url) for the whole process, so requests reuse
+    # warm keep-alive connections instead of paying TCP/TLS setup each time.
+
+    def __init__(self) -> None:
+        self._clients: dict[tuple[str, str], Any] = {}
+
+    def client(self, api_key: str, base_url: str) -> Any:
+        key = (api_key, base_url)
+        client = self._clients.get(key)
+        if client is None:
+            client = self._create(api_key, base_url)
+            self._clients[key] = client
+        return client
+
+    def _create(self, api_key: str, base_url: str) -> Any:
+        if openai is None:
+            raise RuntimeError("OpenAI SDK 不可用")
+        http_client = openai.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=_MAX_CONNECTIONS,
+                max_keepalive_connections=_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            http2=_HTTP2,
+        )
+        return openai.AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+
+    async def aclose(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            try:
+                await client.close()
+            except Exception:
+                pass
+
+
+def get_llm_clients(request: Request) -> LLMClientPool:
+    # Created in the app lifespan; the fallback covers apps mounted without it.
+    pool = getattr(request.app.state, "llm_clients", None)
+    if pool is None:
+        pool = LLMClientPool()
+        request.app.state.llm_clients = pool
+    return pool
+
+
+class Ticket:
+    def __init__(self, priority: int, seq: int) -> None:
+        self.priority = priority
+        self.seq = seq
+        self.future: asyncio.Future[None] | None = None
+
+    def boost(self, priority: int) -> None:
+        # A waiting request can be promoted, e.g. when a user joins a background generation.
+        self.priority = min(self.priority, priority)
+
+
+class LLMScheduler:
+    # Admits at most max_in_flight upstream calls; the rest wait and are admitted by
+    # priority class, FIFO within a class.
+
+    def __init__(self, *, max_in_flight: int) -> None:
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.in_flight = 0
+        self._waiting: list[Ticket] = []
+        self._seq = itertools.count()
+        self._wait_seconds = {name: Summary() for name in _PRIORITY_NAMES.values()}
+
+    def ticket(self, priority: int) -> Ticket:
+        return Ticket(priority, next(self._seq))
+
+    @contextlib.asynccontextmanager
+    async def slot(self, ticket: Ticket | int) -> AsyncIterator[None]:
+        if not isinstance(ticket, Ticket):
+            ticket = self.ticket(ticket)
+        await self._acquire(ticket)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, ticket: Ticket) -> None:
+        started = time.monotonic()
+        if self.in_flight < self.max_in_flight and not self._waiting:
+            self.in_flight += 1
+        else:
+            ticket.future = asyncio.get_running_loop().create_future()
+            self._waiting.append(ticket)
+            try:
+                await ticket.future
+            except asyncio.CancelledError:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                elif not ticket.future.cancelled():
+                    # The slot was handed over just before the cancel landed.
+                    self._release()
+                raise
+        self._wait_seconds[_PRIORITY_NAMES.get(ticket.priority, "background")].observe(time.monotonic() - started)
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        while self._waiting and self.in_flight < self.max_in_flight:
+            ticket = min(self._waiting, key=lambda t: (t.priority, t.seq))
+            self._waiting.remove(ticket)
+            if ticket.future is None or ticket.future.done():
+                continue
+            self.in_flight += 1
+            ticket.future.set_result(None)
+
+    def snapshot(self) -> dict[str, Any]:
+        depth = {name: 0 for name in _PRIORITY_NAMES.values()}
+        for ticket in self._waiting:
+            depth[_PRIORITY_NAMES.get(ticket.priority, "background")] += 1
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": depth,
+            "wait_seconds": {name: summary.snapshot() for name, summary in self._wait_seconds.items()},
+        }
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.chunks: list[str] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self.claimed = False
+        self.ticket: Ticket | None = None
+        self.task: asyncio.Task[None] | None = None
+        self._changed = asyncio.Event()
+
+    def notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self) -> None:
+        await self._changed.wait()
+
+
+class Subscription:
+    def __init__(self, group: SingleFlight, key: str, flight: _Flight, *, leader: bool) -> None:
+        self._group = group
+        self._key = key
+        self._flight = flight
+        self._pos = 0
+        self.leader = leader
+
+    def __aiter__(self) -> Subscription:
+        return self
+
+    async def __anext__(self) -> str:
+        flight = self._flight
+        while True:
+            if self._pos < len(flight.chunks):
+                piece = flight.chunks[self._pos]
+                self._pos += 1
+                return piece
+            if flight.done:
+                if flight.error is not None:
+                    raise flight.error
+                raise StopAsyncIteration
+            await flight.wait()
+
+    def claim(self) -> bool:
+        # True for exactly one subscriber of a completed flight, e.g. to persist the text once.
+        flight = self._flight
+        if not flight.done or flight.error is not None or flight.claimed:
+            return False
+        flight.claimed = True
+        return True
+
+    async def __aenter__(self) -> Subscription:
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        self._group._leave(self._key, self._flight)
+
+
+class SingleFlight:
+    # Concurrent requests for the same key share one upstream stream. Late joiners get the
+    # chunks produced so far, then the live tail. The upstream is cancelled once nobody listens.
+
+    def __init__(self, scheduler: LLMScheduler | None = None) -> None:
+        self._flights: dict[str, _Flight] = {}
+        self._scheduler = scheduler
+
+    def join(
+        self,
+        key: str,
+        factory: Callable[[], AsyncIterator[str]],
+        *,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> Subscription:
+        flight = self._flights.get(key)
+        leader = flight is None
+        if flight is None:
+            flight = _Flight()
+            if self._scheduler is not None:
+                flight.ticket = self._scheduler.ticket(priority)
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._drive(key, flight, factory))
+        elif flight.ticket is not None:
+            flight.ticket.boost(priority)
+        flight.subscribers += 1
+        return Subscription(self, key, flight, leader=leader)
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._flights
+
+    async def _drive(self, key: str, flight: _Flight, factory: Callable[[], AsyncIterator[str]]) -> None:
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                if self._scheduler is not None and flight.ticket is not None:
+                    await stack.enter_async_context(self._scheduler.slot(flight.ticket))
+                upstream = await stack.enter_async_context(contextlib.aclosing(factory()))
+                async for piece in upstream:
+                    flight.chunks.append(piece)
+                    flight.notify()
+        except asyncio.CancelledError:
+            flight.error = RuntimeError("upstream stream cancelled")
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.notify()
+
+    def _leave(self, key: str, flight: _Flight) -> None:
+        flight.subscribers -= 1
+        if flight.subscribers <= 0 and not flight.done and flight.task is not None:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.task.cancel()
+
+
+llm_scheduler = LLMScheduler(max_in_flight=_MAX_IN_FLIGHT)
+llm_flights = SingleFlight(llm_scheduler)
+llm_breaker = CircuitBreaker(
+    failure_threshold=_BREAKER_FAILURES,
+    window_seconds=_BREAKER_WINDOW_SECONDS,
+    cooldown_seconds=_BREAKER_COOLDOWN_SECONDS,
+)
+register_collector("llm_scheduler", llm_scheduler.snapshot)
+register_collector("llm_breaker", llm_breaker.snapshot)
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import re
+from collections.abc import AsyncIterable, AsyncIterator
+
+# Incremental equivalent of routes.public._clean_ai_markdown: feeding any split of a text and
+# joining the output gives exactly _clean_ai_markdown(text). Each pass looks at a chunk once and
+# only carries the few characters whose meaning depends on what comes next.
+
+_WS = " \t\uFE0F\u200B\u00A0\u3000"
+_TAG_FALSE = "TAGS_SHORT_READ_WARNING false"
+_TAG_TRUE = "TAGS_SHORT_READ_WARNING true"
+
+_LEADING_WS_BEFORE_HEADING = re.compile(rf"(?m)^[{_WS}]+(?=#)")
+_WS_AFTER_HASHES = re.compile(rf"#[{_WS}]+")
+_WS_AFTER_BOLD_HEADING = re.compile(rf"(# \*\*)[{_WS}]+")
+
+
+class _Remove:
+    # str.replace(needle, ""), holding back a suffix that may still become a match.
+
+    def __init__(self, needle: str) -> None:
+        self.needle = needle
+        self._held = ""
+
+    def feed(self, s: str) -> str:
+        buf = self._held + s
+        needle = self.needle
+        out: list[str] = []
+        start = 0
+        while (i := buf.find(needle, start)) != -1:
+            out.append(buf[start:i])
+            start = i + len(needle)
+        rest = buf[start:]
+        keep = 0
+        floor = max(0, len(rest) - len(needle) + 1)
+        j = rest.rfind(needle[0], floor)
+        while j != -1:
+            if needle.startswith(rest[j:]):
+                keep = len(rest) - j
+            j = rest.rfind(needle[0], floor, j)
+        out.append(rest[: len(rest) - keep])
+        self._held = rest[len(rest) - keep :]
+        return "".join(out)
+
+    def flush(self) -> str:
+        held, self._held = self._held, ""
+        return held
+
+
+class _LineStartHeading:
+    # Drops blanks at the start of a line when a '#' follows; a line that is blank so far waits.
+
+    def __init__(self) -> None:
+        self._held = ""
+        self._bol = True
+
+    def feed(self, s: str) -> str:
+        text = ("\n" if self._bol else "\0") + self._held + s
+        out = _LEADING_WS_BEFORE_HEADING.sub("", text)[1:]
+        nl = out.rfind("\n")
+        tail = out[nl + 1 :]
+        if tail and (nl != -1 or self._bol) and not tail.strip(_WS):
+            self._held = tail
+            self._bol = True
+            return out[: len(out) - len(tail)]
+        self._held = ""
+        if out:
+            self._bol = out.endswith("\n")
+        return out
+
+    def flush(self) -> str:
+        held, self._held = self._held, ""
+        return held
+
+
+class _Contextual:
+    # Regex pass whose matches can start in already emitted text; re-reads only `width` chars of it.
+
+    def __init__(self, pattern: re.Pattern[str], repl: str, width: int) -> None:
+        self.pattern = pattern
+        self.repl = repl
+        self.width = width
+        self._ctx = ""
+
+    def feed(self, s: str) -> str:
+        out = self.pattern.sub(self.repl, self._ctx + s)[len(self._ctx) :]
+        self._ctx = (self._ctx + out)[-self.width :]
+        return out
+
+    def flush(self) -> str:
+        return ""
+
+
+class _Strip:
+    def __init__(self) -> None:
+        self._started = False
+        self._pending = ""
+
+    def feed(self, s: str) -> str:
+        if not self._started:
+            s = s.lstrip()
+            if not s:
+                return ""
+            self._started = True
+        body = s.rstrip()
+        if not body:
+            self._pending += s
+            return ""
+        out = self._pending + body
+        self._pending = s[len(body) :]
+        return out
+
+    def flush(self) -> str:
+        self._pending = ""
+        return ""
+
+
+class MarkdownSanitizer:
+    def __init__(self) -> None:
+        self._passes = (
+            _Remove(_TAG_FALSE),
+            _Remove(_TAG_TRUE),
+            _LineStartHeading(),
+            _Contextual(_WS_AFTER_HASHES, "# ", 2),
+            _Contextual(_WS_AFTER_BOLD_HEADING, r"\1", 4),
+            _Strip(),
+        )
+
+    def feed(self, chunk: str) -> str:
+        for p in self._passes:
+            if not chunk:
+                return ""
+            chunk = p.feed(chunk)
+        return chunk
+
+    def flush(self) -> str:
+        out = ""
+        for p in self._passes:
+            out = p.flush() if not out else p.feed(out) + p.flush()
+        return out
+
+
+async def sanitize_markdown_stream(chunks: AsyncIterable[object]) -> AsyncIterator[str]:
+    sanitizer = MarkdownSanitizer()
+    async for part in chunks:
+        out = sanitizer.feed(str(part or ""))
+        if out:
+            yield out
+    out = sanitizer.flush()
+    if out:
+        yield out
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import threading
+from collections.abc import Callable
+from typing import Any
+
+
+class Summary:
+    # Count / total / max of observed values (e.g. seconds waited); cheap enough for hot paths.
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def snapshot(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                "count": self.count,
+                "total": round(self.total, 6),
+                "avg": round(self.total / self.count, 6) if self.count else 0.0,
+                "max": round(self.max, 6),
+            }
+
+
+_collectors: dict[str, Callable[[], Any]] = {}
+
+
+def register_collector(name: str, collect: Callable[[], Any]) -> None:
+    _collectors[name] = collect
+
+
+def collect_metrics() -> dict[str, Any]:
+    out: dict[str, Any] = {}
+    for name, collect in list(_collectors.items()):
+        try:
+            out[name] = collect()
+        except Exception as e:
+            out[name] = {"error": str(e)}
+    return out
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import os
+from typing import NamedTuple
+
+from sqlalchemy.orm import Session, joinedload
+
+from app.models import Answer, Test
+from app.services.cache import TTLCache
+from app.services.reporting import generate_dynamic_insights
+
+
+class ProfileContext(NamedTuple):
+    type_code: str
+    text: str
+
+
+# A completed test's answers and result do not change, so the context is reused across the
+# result page, the SSE stream and background pregeneration of the same test.
+_profile_cache: TTLCache[tuple[int, str], ProfileContext] = TTLCache(
+    maxsize=int(os.getenv("MBTI_PROFILE_CONTEXT_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("MBTI_PROFILE_CONTEXT_CACHE_TTL_SECONDS", "3600")),
+)
+
+
+def load_answer_rows(db: Session, test_id: int) -> list[Answer]:
+    return (
+        db.query(Answer)
+        .options(joinedload(Answer.question))
+        .filter(Answer.test_id == test_id)
+        .order_by(Answer.answered_at.asc())
+        .all()
+    )
+
+
+def _dimensions_str(dims: dict[str, dict]) -> str:
+    parts: list[str] = []
+    for dim in ["EI", "SN", "TF", "JP"]:
+        info = dims.get(dim) or {}
+        fp = info.get("first_percent")
+        sp = info.get("second_percent")
+        first = info.get("first_pole")
+        second = info.get("second_pole")
+        if fp is None or sp is None or not first or not second:
+            continue
+        parts.append(f"{first}:{fp}% / {second}:{sp}%")
+    return ", ".join(parts) if parts else "维度数据缺失"
+
+
+def _extremes_str(answers: list[Answer]) -> str:
+    items: list[str] = []
+    for idx, a in enumerate(answers, start=1):
+        try:
+            v = int(getattr(a, "value", 0))
+        except Exception:
+            continue
+        if v not in (1, 5):
+            continue
+        q = getattr(a, "question", None)
+        if not q:
+            continue
+        text = str(getattr(q, "text", "") or "").strip()
+        dim = str(getattr(q, "dimension", "") or "").strip()
+        agree = str(getattr(q, "agree_pole", "") or "").strip()
+        if len(dim) == 2 and len(agree) == 1:
+            opposite = dim[1] if dim[0] == agree else (dim[0] if dim[1] == agree else "?")
+        else:
+            opposite = "?"
+        pole = agree if v == 5 else opposite
+        snippet = text[:48] + ("…" if len(text) > 48 else "")
+        items.append(f"{idx}. [{dim}/{pole}向] {v}分：{snippet}")
+        if len(items) >= 6:
+            break
+    return "；".join(items) if items else "未发现明显的极值作答（1分/5分）"
+
+
+def _behaviour_tags(dims: dict[str, dict], answers: list[Answer], insights: list[str]) -> list[str]:
+    tags: list[str] = []
+    for dim, info in (dims or {}).items():
+        try:
+            gap = int(info.get("gap_percent"))
+        except Exception:
+            continue
+        if gap < 20:
+            tags.append(f"{dim}均衡")
+        elif gap > 60:
+            tags.append(f"{dim}极致")
+    if any(getattr(a, "value", None) == 5 for a in answers):
+        tags.append("立场坚定")
+    if any("尽管你整体偏向" in s for s in insights):
+        tags.append("反差发力")
+    return tags[:6]
+
+
+def _build(db: Session, test_row: Test) -> ProfileContext:
+    result = test_row.result_json or {}
+    type_code = str(result.get("type") or test_row.result_type or "Unknown")
+    dims: dict[str, dict] = dict(result.get("dimensions") or {})
+    answers = load_answer_rows(db, test_row.id)
+
+    # Only the insights are needed here, not the whole report context.
+    insights = [str(x).strip() for x in generate_dynamic_insights(dims, answers) if str(x).strip()]
+    tags = _behaviour_tags(dims, answers, insights)
+
+    dynamic_insights = "；".join(insights[:3]) if insights else "暂无动态洞察"
+    dynamic_tags = "动态标签：" + (", ".join([f"[{t}]" for t in tags]) if tags else "[稳定作答]")
+
+    text = f"""
+用户MBTI类型：{type_code}
+【维度数据】：{_dimensions_str(dims)}
+【极值特质】：{_extremes_str(answers)}
+【行为标签】：{dynamic_tags}
+【动态洞察】：{dynamic_insights}
+请综合上述数据，忽略刻板印象，还原一个鲜活的人。
+""".strip()
+    return ProfileContext(type_code, text)
+
+
+def build_profile_context(db: Session, test_row: Test, *, prompt_version: str) -> ProfileContext:
+    if test_row.status != "completed":
+        return _build(db, test_row)
+
+    key = (int(test_row.id), prompt_version)
+    cached = _profile_cache.get(key)
+    if cached is None:
+        cached = _build(db, test_row)
+        _profile_cache.set(key, cached)
+    return cached
+
+
+def invalidate_profile_context() -> None:
+    _profile_cache.clear()
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+from functools import cached_property
+from types import MappingProxyType
+from typing import NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import Question
+from app.services.scoring import ScoringPlan, compile_scoring_plan
+
+
+_DIMS = ("EI", "SN", "TF", "JP")
+_DIM_PAIRS = {"EI": "E-I", "SN": "S-N", "TF": "T-F", "JP": "J-P"}
+
+# Admin writes in this process invalidate immediately; the TTL bounds staleness across workers.
+_SNAPSHOT_TTL_SECONDS = float(os.getenv("MBTI_QUESTION_BANK_TTL_SECONDS", "60"))
+
+
+class BankQuestion(NamedTuple):
+    id: int
+    dimension: str
+    agree_pole: str
+    text: str
+    source: str
+
+
+@dataclass(frozen=True)
+class QuestionBankSnapshot:
+    version: int
+    epoch: int
+    loaded_at: float
+    questions: tuple[BankQuestion, ...]
+    by_id: Mapping[int, BankQuestion]
+    by_dimension: Mapping[str, tuple[BankQuestion, ...]]
+    by_source: Mapping[str, Mapping[str, tuple[BankQuestion, ...]]]
+
+    def bucket(self, dimension: str, *, source: str | None = None) -> tuple[BankQuestion, ...]:
+        if source is None:
+            return self.by_dimension.get(dimension, ())
+        return self.by_source.get(source, {}).get(dimension, ())
+
+    def has_source(self, source: str) -> bool:
+        return any(self.by_source.get(source, {}).values())
+
+    @cached_property
+    def scoring_plan(self) -> ScoringPlan:
+        return compile_scoring_plan(self.questions)
+
+    @cached_property
+    def tie_breaker_payload(self) -> tuple[bytes, str]:
+        # Preferred pool: source == "tie_breaker"; fallback: every active question.
+        # The client skips ids already in its test, so the body is identical for every test.
+        if self.has_source("tie_breaker"):
+            rows = [q for qs in self.by_source["tie_breaker"].values() for q in qs]
+        else:
+            rows = list(self.questions)
+
+        pool: dict[str, list[dict[str, object]]] = {}
+        for q in rows:
+            pool.setdefault(_DIM_PAIRS.get(q.dimension, q.dimension), []).append(
+                {"id": q.id, "text": q.text, "dimension": q.dimension, "agree_pole": q.agree_pole}
+            )
+        body = json.dumps(pool, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return body, f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+_lock = threading.Lock()
+_epoch = 0
+_versions = itertools.count(1)
+_snapshot: QuestionBankSnapshot | None = None
+
+
+def _is_fresh(snap: QuestionBankSnapshot | None) -> bool:
+    return (
+        snap is not None
+        and snap.epoch == _epoch
+        and time.monotonic() - snap.loaded_at < _SNAPSHOT_TTL_SECONDS
+    )
+
+
+def _build_snapshot(rows: list[tuple], *, epoch: int) -> QuestionBankSnapshot:
+    questions = tuple(
+        BankQuestion(int(qid), str(dim), str(pole), str(text), str(source)) for qid, dim, pole, text, source in rows
+    )
+
+    by_dimension: dict[str, list[BankQuestion]] = {d: [] for d in _DIMS}
+    by_source: dict[str, dict[str, list[BankQuestion]]] = {}
+    for q in questions:
+        by_dimension.setdefault(q.dimension, []).append(q)
+        by_source.setdefault(q.source, {}).setdefault(q.dimension, []).append(q)
+
+    return QuestionBankSnapshot(
+        version=next(_versions),
+        epoch=epoch,
+        loaded_at=time.monotonic(),
+        questions=questions,
+        by_id=MappingProxyType({q.id: q for q in questions}),
+        by_dimension=MappingProxyType({d: tuple(qs) for d, qs in by_dimension.items()}),
+        by_source=MappingProxyType(
+            {
+                src: MappingProxyType({d: tuple(qs) for d, qs in dims.items()})
+                for src, dims in by_source.items()
+            }
+        ),
+    )
+
+
+def get_question_bank(db: Session) -> QuestionBankSnapshot:
+    global _snapshot
+
+    snap = _snapshot
+    if _is_fresh(snap):
+        return snap
+
+    with _lock:
+        snap = _snapshot
+        if _is_fresh(snap):
+            return snap
+
+        epoch = _epoch
+        rows = db.execute(
+            select(Question.id, Question.dimension, Question.agree_pole, Question.text, Question.source)
+            .where(Question.is_active.is_(True))
+            .order_by(Question.id.asc())
+        ).all()
+        snap = _build_snapshot([tuple(r) for r in rows], epoch=epoch)
+        _snapshot = snap
+        return snap
+
+
+def invalidate_question_bank() -> None:
+    global _epoch
+    # Lock-free on purpose: a load already in flight captured the old epoch and is discarded on next read.
+    _epoch += 1
@@ -1,7 +1,14 @@
 from __future__ import annotations
 
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass
 from typing import Any
 
+try:
+    import numpy as np
+except Exception:  # pragma: no cover
+    np = None
+
 
 _DIMS = ("EI", "SN", "TF", "JP")
 _POLES: dict[str, tuple[str, str]] = {
@@ -30,12 +37,30 @@ def is_near_boundary(first_percent: int, *, threshold_gap_percent: int = 10) ->
     return gap < threshold_gap_percent
 
 
+def boundary_notes(dimensions: dict[str, Any], *, threshold_gap_percent: int = 10) -> list[str]:
+    notes: list[str] = []
+    for d in _DIMS:
+        info = dimensions[d]
+        fp = int(info["first_percent"])
+        sp = int(info["second_percent"])
+        if is_near_boundary(fp, threshold_gap_percent=threshold_gap_percent):
+            notes.append(f"{d} 接近边界（{info['first_pole']} {fp}% / {info['second_pole']} {sp}%）")
+    return notes
+
+
+def answer_score(dimension: str, agree_pole: str, value: int) -> int:
+    # Contribution of one answer to its dimension's score; positive leans toward the first pole.
+    first_pole, _second_pole = dimension_poles(dimension)
+    delta = int(value) - 3
+    return delta if str(agree_pole) == first_pole else -delta
+
+
 def score_dimension(
     dimension: str,
     questions: list[Any],
     answers: dict[Any, int],
 ) -> dict[str, Any]:
-    first_pole, second_pole = dimension_poles(dimension)
+    first_pole, _second_pole = dimension_poles(dimension)
 
     score = 0
     answered = 0
@@ -54,6 +79,12 @@ def score_dimension(
             score -= delta
         answered += 1
 
+    return dimension_result(dimension, score, answered)
+
+
+def dimension_result(dimension: str, score: int, answered: int) -> dict[str, Any]:
+    first_pole, second_pole = dimension_poles(dimension)
+
     if answered <= 0:
         first_percent = 50
     else:
@@ -77,13 +108,142 @@ def score_dimension(
     }
 
 
+def _assemble(dimensions: dict[str, Any]) -> dict[str, Any]:
+    type_letters = [
+        out["first_pole"] if out["score"] >= 0 else out["second_pole"] for out in (dimensions[d] for d in _DIMS)
+    ]
+    return {"type": "".join(type_letters), "dimensions": dimensions}
+
+
+@dataclass(frozen=True)
+class ScoringPlan:
+    # question id -> (index into _DIMS, +1 if agree_pole is the dimension's first pole else -1)
+    index: Mapping[Any, tuple[int, int]]
+
+    def __contains__(self, qid: Any) -> bool:
+        return qid in self.index
+
+    def totals(self, answers: Mapping[Any, int]) -> list[list[int]]:
+        # One pass over the answers; [score, answered] per dimension in _DIMS order.
+        acc = [[0, 0], [0, 0], [0, 0], [0, 0]]
+        index = self.index
+        for qid, value in answers.items():
+            entry = index.get(qid)
+            if entry is None:
+                continue
+            slot = acc[entry[0]]
+            slot[0] += entry[1] * (int(value) - 3)
+            slot[1] += 1
+        return acc
+
+    def score(self, answers: Mapping[Any, int]) -> dict[str, Any]:
+        acc = self.totals(answers)
+        return _assemble({dim: dimension_result(dim, *acc[i]) for i, dim in enumerate(_DIMS)})
+
+
+def compile_scoring_plan(questions: Iterable[Any]) -> ScoringPlan:
+    index: dict[Any, tuple[int, int]] = {}
+    for q in questions:
+        dimension = _get(q, "dimension")
+        if dimension not in _POLES:
+            continue
+        sign = 1 if str(_get(q, "agree_pole")) == _POLES[dimension][0] else -1
+        index[_get(q, "id")] = (_DIMS.index(dimension), sign)
+    return ScoringPlan(index=index)
+
+
 def score_all(questions: list[Any], answers: dict[Any, int]) -> dict[str, Any]:
-    dimensions: dict[str, Any] = {}
-    type_letters: list[str] = []
-    for dim in _DIMS:
-        out = score_dimension(dim, questions, answers)
-        dimensions[dim] = out
-        type_letters.append(out["first_pole"] if out["score"] >= 0 else out["second_pole"])
+    return compile_scoring_plan(questions).score(answers)
+
+
+def score_totals(totals: Mapping[str, tuple[int, int]]) -> dict[str, Any]:
+    # Same output as score_all, from running (score, answered) totals per dimension.
+    return _assemble({dim: dimension_result(dim, *totals.get(dim, (0, 0))) for dim in _DIMS})
+
+
+def score_batch(dimension_index: Sequence[int], signs: Sequence[int], values: Any) -> dict[str, Any]:
+    # Vectorized score_dimension for many tests at once.
+    # values: (n_tests, n_questions) matrix of 1-5 answers, 0 = unanswered.
+    # dimension_index[j]: index into _DIMS for column j (-1 = ignore); signs[j]: +1 if the question
+    # agrees with its dimension's first pole, else -1. Arrays come back as (n_tests, 4) in _DIMS order.
+    if np is None:
+        raise RuntimeError("score_batch requires numpy")
+
+    vals = np.asarray(values, dtype=np.int64)
+    if vals.ndim != 2:
+        raise ValueError(f"values must be 2-dimensional, got shape {vals.shape}")
+    dim_idx = np.asarray(dimension_index, dtype=np.int64)
+    sign = np.asarray(signs, dtype=np.int64)
+    if dim_idx.shape != (vals.shape[1],) or sign.shape != (vals.shape[1],):
+        raise ValueError("dimension_index and signs must have one entry per question column")
+
+    onehot = (dim_idx[:, None] == np.arange(len(_DIMS))[None, :]).astype(np.int64)
+    answered_mask = vals > 0
+    score = np.where(answered_mask, (vals - 3) * sign, 0) @ onehot
+    answered = answered_mask.astype(np.int64) @ onehot
+
+    # Same float expression as score_dimension; np.rint rounds half to even like round().
+    with np.errstate(divide="ignore", invalid="ignore"):
+        raw_percent = np.rint(score / (2 * answered) * 50 + 50)
+    first_percent = np.where(answered > 0, np.clip(raw_percent, 0, 100), 50).astype(np.int64)
+    second_percent = 100 - first_percent
+
+    poles = np.array([_POLES[d] for d in _DIMS])
+    letters = np.where(score >= 0, poles[:, 0], poles[:, 1])
+
+    return {
+        "score": score,
+        "answered": answered,
+        "first_percent": first_percent,
+        "second_percent": second_percent,
+        "gap_percent": np.abs(first_percent - second_percent),
+        "types": ["".join(row) for row in letters],
+    }
 
-    return {"type": "".join(type_letters), "dimensions": dimensions}
 
+def score_all_batch(questions: list[Any], answer_maps: Sequence[dict[Any, int]]) -> list[dict[str, Any]]:
+    # Batch equivalent of [score_all(questions, a) for a in answer_maps].
+    if np is None:
+        raise RuntimeError("score_all_batch requires numpy")
+
+    columns: dict[Any, int] = {}
+    dimension_index: list[int] = []
+    signs: list[int] = []
+    for q in questions:
+        qid = _get(q, "id")
+        if qid in columns:
+            continue
+        dim = str(_get(q, "dimension"))
+        columns[qid] = len(dimension_index)
+        dimension_index.append(_DIMS.index(dim) if dim in _POLES else -1)
+        signs.append(1 if dim in _POLES and str(_get(q, "agree_pole")) == _POLES[dim][0] else -1)
+
+    values = np.zeros((len(answer_maps), len(columns)), dtype=np.int64)
+    for row, answers in enumerate(answer_maps):
+        for qid, value in answers.items():
+            col = columns.get(qid)
+            if col is not None:
+                values[row, col] = int(value)
+
+    return batch_to_results(score_batch(dimension_index, signs, values))
+
+
+def batch_to_results(out: dict[str, Any]) -> list[dict[str, Any]]:
+    # Expand score_batch arrays into score_all-shaped dicts, one per test.
+    results: list[dict[str, Any]] = []
+    for row, type_code in enumerate(out["types"]):
+        dimensions: dict[str, Any] = {}
+        for col, dim in enumerate(_DIMS):
+            first_pole, second_pole = _POLES[dim]
+            dimensions[dim] = {
+                "dimension": dim,
+                "first_pole": first_pole,
+                "second_pole": second_pole,
+                "score": int(out["score"][row, col]),
+                "answered": int(out["answered"][row, col]),
+                "first_percent": int(out["first_percent"][row, col]),
+                "second_percent": int(out["second_percent"][row, col]),
+                "gap_percent": int(out["gap_percent"][row, col]),
+            }
+        results.append({"type": type_code, "dimensions": dimensions})
+    return results
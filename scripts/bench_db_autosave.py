@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.db import _engine_options, _sqlite_pragmas, apply_sqlite_pragmas
+from app.models import Answer, Base, Question, Test, TestItem, TestProgress
+
+_DIMS = ("EI", "SN", "TF", "JP")
+
+# Each step adds one setting on top of the previous one, so the table shows what each buys.
+_SQLITE_STEPS: list[tuple[str, dict[str, str]]] = [
+    ("defaults", {}),
+    ("+ journal_mode=WAL", {"MBTI_SQLITE_JOURNAL_MODE": "WAL"}),
+    ("+ synchronous=NORMAL", {"MBTI_SQLITE_SYNCHRONOUS": "NORMAL"}),
+    ("+ busy_timeout=5000", {"MBTI_SQLITE_BUSY_TIMEOUT_MS": "5000"}),
+    ("+ mmap_size=256MB", {"MBTI_SQLITE_MMAP_SIZE": str(256 * 1024 * 1024)}),
+]
+_POOL_STEPS: list[tuple[str, dict[str, str]]] = [
+    ("defaults", {}),
+    ("pool_size=20 max_overflow=10", {"MBTI_DB_POOL_SIZE": "20", "MBTI_DB_MAX_OVERFLOW": "10"}),
+    ("+ pre_ping off", {"MBTI_DB_POOL_PRE_PING": "0"}),
+    ("+ recycle off", {"MBTI_DB_POOL_RECYCLE_SECONDS": "0"}),
+]
+_ENV_KEYS = {k for _label, env in _SQLITE_STEPS + _POOL_STEPS for k in env}
+
+
+def _engine(url: str, env: dict[str, str]):
+    for key in _ENV_KEYS:
+        os.environ.pop(key, None)
+    os.environ.update(env)
+    is_sqlite = url.startswith("sqlite")
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False} if is_sqlite else {},
+        **_engine_options(url),
+    )
+    if is_sqlite:
+        apply_sqlite_pragmas(engine, _sqlite_pragmas())
+    return engine
+
+
+def _prepare(url: str, *, tests: int, questions_per_test: int) -> list[int]:
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with Session(engine) as s:
+        questions = [
+            Question(dimension=_DIMS[i % 4], agree_pole=_DIMS[i % 4][i % 2], text=f"Q{i}", source="bench")
+            for i in range(questions_per_test)
+        ]
+        s.add_all(questions)
+        s.flush()
+        ids: list[int] = []
+        for n in range(tests):
+            t = Test(
+                mode=questions_per_test,
+                target_count=questions_per_test,
+                test_token_hash=f"t{n}",
+                resume_token_hash=f"r{n}",
+                resume_code_hash=f"c{n}",
+            )
+            s.add(t)
+            s.flush()
+            s.add(TestProgress(test_id=t.id, revision=0))
+            s.add_all(TestItem(test_id=t.id, position=i + 1, question_id=q.id) for i, q in enumerate(questions))
+            ids.append(t.id)
+        s.commit()
+    engine.dispose()
+    return ids
+
+
+def _worker(args: tuple[str, dict[str, str], list[int], float, int]) -> tuple[int, int, int]:
+    # One process per uvicorn worker: autosaves for its own users plus result-page style reads.
+    url, env, test_ids, seconds, seed = args
+    from app.routes.public import _bump_revision, _save_answers
+
+    engine = _engine(url, env)
+    rng = random.Random(seed)
+    with Session(engine) as s:
+        qids = [qid for (qid,) in s.execute(select(TestItem.question_id).where(TestItem.test_id == test_ids[0]))]
+
+    saves = reads = locked = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        test_id = rng.choice(test_ids)
+        with Session(engine) as db:
+            try:
+                _bump_revision(db, test_id)
+                picked = rng.sample(qids, k=min(3, len(qids)))
+                _save_answers(db, test_id, {q: rng.randint(1, 5) for q in picked}, now=datetime.now(timezone.utc))
+                db.commit()
+                saves += 1
+            except OperationalError:
+                db.rollback()
+                locked += 1
+            try:
+                db.execute(select(func.count(Answer.id)).where(Answer.test_id == test_id)).scalar()
+                reads += 1
+            except OperationalError:
+                db.rollback()
+                locked += 1
+    engine.dispose()
+    return saves, reads, locked
+
+
+def _run(url: str, env: dict[str, str], *, workers: int, seconds: float, test_ids: list[int]):
+    chunks = [test_ids[i::workers] for i in range(workers)]
+    jobs = [(url, env, chunk, seconds, i) for i, chunk in enumerate(chunks)]
+    # Apply once in the parent so WAL (a persistent file setting) is in place before workers start.
+    _engine(url, env).dispose()
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        results = pool.map(_worker, jobs)
+    return [sum(col) for col in zip(*results)]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Autosave throughput under each database engine setting.")
+    parser.add_argument("--url", help="Database URL; default: a fresh SQLite file per step")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent processes (uvicorn workers)")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Duration of each step")
+    parser.add_argument("--tests", type=int, default=64, help="Tests being answered concurrently")
+    parser.add_argument("--questions", type=int, default=60)
+    args = parser.parse_args()
+
+    steps = _SQLITE_STEPS if not args.url or args.url.startswith("sqlite") else _POOL_STEPS
+    print(f"{'setting':<30} {'saves/s':>9} {'reads/s':>9} {'locked':>7}")
+    env: dict[str, str] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (label, extra) in enumerate(steps):
+            env = {**env, **extra}
+            url = args.url or f"sqlite:///{Path(tmp) / f'bench{i}.db'}"
+            test_ids = _prepare(url, tests=args.tests, questions_per_test=args.questions)
+            saves, reads, locked = _run(url, env, workers=args.workers, seconds=args.seconds, test_ids=test_ids)
+            print(f"{label:<30} {saves / args.seconds:>9.0f} {reads / args.seconds:>9.0f} {locked:>7}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sys
+import timeit
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.routes.public import _clean_ai_markdown
+from app.services.markdown_stream import MarkdownSanitizer
+
+
+def _carry_sanitize(chunks: list[str], carry_size: int = 96) -> str:
+    # The previous streaming sanitizer: re-runs every pass over tail + chunk.
+    tail = ""
+    out: list[str] = []
+    for s in chunks:
+        combined = tail + s
+        combined = combined.replace("TAGS_SHORT_READ_WARNING false", "").replace("TAGS_SHORT_READ_WARNING true", "")
+        combined = re.sub(r"(?m)^[ \t\uFE0F\u200B\u00A0\u3000]+(#{1,6})", r"\1", combined)
+        combined = re.sub(r"(?m)^(#+)[ \t\uFE0F\u200B\u00A0\u3000]+", r"\1 ", combined)
+        combined = re.sub(r"(?m)(#{1,6} \\*\\*)[ \t\uFE0F\u200B\u00A0\u3000]+", r"\1", combined)
+        if len(combined) <= carry_size:
+            tail = combined
+            continue
+        out.append(combined[:-carry_size])
+        tail = combined[-carry_size:]
+    out.append(tail)
+    return "".join(out)
+
+
+def _incremental(chunks: list[str]) -> str:
+    sanitizer = MarkdownSanitizer()
+    return "".join(sanitizer.feed(c) for c in chunks) + sanitizer.flush()
+
+
+def _make_stream(chars: int, *, rng: random.Random) -> list[str]:
+    lines = [
+        "## \uFE0F 你的核心驱动力",
+        "   ### **  关系中的你",
+        "你倾向于先在内心整理想法，再把结论分享给信任的人。",
+        "- **优势**：专注、可靠、善于独立思考",
+        "TAGS_SHORT_READ_WARNING false",
+    ]
+    text = ""
+    while len(text) < chars:
+        text += rng.choice(lines) + "\n"
+    # Model tokens are short: split into 1-6 character pieces.
+    chunks, i = [], 0
+    while i < len(text):
+        n = rng.randint(1, 6)
+        chunks.append(text[i : i + n])
+        i += n
+    return chunks
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare the carry-buffer and incremental markdown sanitizers.")
+    parser.add_argument("--sizes", default="2000,8000,32000", help="Comma-separated stream lengths in characters")
+    parser.add_argument("--number", type=int, default=20, help="Runs per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'chars':>7} {'chunks':>7} {'carry ms':>9} {'incremental ms':>15} {'speedup':>8}")
+    for size in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        chunks = _make_stream(size, rng=rng)
+        assert _incremental(chunks) == _clean_ai_markdown("".join(chunks))
+
+        carry = min(timeit.repeat(lambda: _carry_sanitize(chunks), number=args.number, repeat=3)) / args.number
+        inc = min(timeit.repeat(lambda: _incremental(chunks), number=args.number, repeat=3)) / args.number
+        print(f"{size:>7} {len(chunks):>7} {carry * 1e3:>9.2f} {inc * 1e3:>15.2f} {carry / inc:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import timeit
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.services.scoring import _assemble, compile_scoring_plan, score_all, score_dimension
+
+_DIMS = ("EI", "SN", "TF", "JP")
+
+
+def _score_all_per_dimension(questions, answers):
+    # The previous score_all: four full scans, one per dimension.
+    return _assemble({dim: score_dimension(dim, questions, answers) for dim in _DIMS})
+
+
+def _make_test(size: int, *, bank_size: int, rng: random.Random):
+    bank = [
+        {"id": qid, "dimension": _DIMS[qid % 4], "agree_pole": rng.choice(_DIMS[qid % 4])}
+        for qid in range(1, bank_size + 1)
+    ]
+    questions = rng.sample(bank, size)
+    answers = {q["id"]: rng.randint(1, 5) for q in questions}
+    return bank, questions, answers
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare per-dimension scoring with the precompiled plan.")
+    parser.add_argument("--sizes", default="20,40,60", help="Comma-separated test lengths")
+    parser.add_argument("--bank-size", type=int, default=200, help="Questions in the simulated bank")
+    parser.add_argument("--number", type=int, default=20000, help="Calls per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'size':>5} {'per-dim us':>11} {'score_all us':>13} {'plan us':>9} {'speedup':>8}")
+    for size in [int(x) for x in args.sizes.split(",") if x.strip()]:
+        bank, questions, answers = _make_test(size, bank_size=args.bank_size, rng=rng)
+        plan = compile_scoring_plan(bank)  # what the question-bank snapshot caches per version
+        assert plan.score(answers) == _score_all_per_dimension(questions, answers) == score_all(questions, answers)
+
+        legacy = min(timeit.repeat(lambda: _score_all_per_dimension(questions, answers), number=args.number, repeat=3))
+        single = min(timeit.repeat(lambda: score_all(questions, answers), number=args.number, repeat=3))
+        cached = min(timeit.repeat(lambda: plan.score(answers), number=args.number, repeat=3))
+
+        per_call = 1e6 / args.number
+        print(
+            f"{size:>5} {legacy * per_call:>11.2f} {single * per_call:>13.2f} {cached * per_call:>9.2f}"
+            f" {legacy / cached:>7.1f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
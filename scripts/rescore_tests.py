@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.models import Answer, Question, Test
+from app.services.scoring import batch_to_results, boundary_notes, np, score_batch
+
+_DIMS = ("EI", "SN", "TF", "JP")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Re-score completed tests against current question polarity.")
+    parser.add_argument(
+        "--db",
+        default="sqlite:///./mbti.db",
+        help="Database URL, default: sqlite:///./mbti.db",
+    )
+    parser.add_argument("--batch-size", type=int, default=5000, help="Tests scored per matrix")
+    parser.add_argument("--apply", action="store_true", help="Write changed results back (default: dry run)")
+    args = parser.parse_args()
+
+    if np is None:
+        raise SystemExit("numpy is required: pip install numpy")
+
+    engine = create_engine(
+        args.db,
+        connect_args={"check_same_thread": False} if str(args.db).startswith("sqlite") else {},
+    )
+
+    with Session(engine) as s:
+        # Like score_all, questions outside the four dimensions do not count toward any score.
+        questions = [
+            q
+            for q in s.execute(select(Question.id, Question.dimension, Question.agree_pole)).all()
+            if q.dimension in _DIMS
+        ]
+        if not questions:
+            print("No questions.")
+            return 0
+
+        qids = np.array([int(q.id) for q in questions], dtype=np.int64)
+        dimension_index = np.array([_DIMS.index(q.dimension) for q in questions], dtype=np.int64)
+        signs = np.array(
+            [1 if q.agree_pole == q.dimension[0] else -1 for q in questions],
+            dtype=np.int64,
+        )
+        col_of = np.full(int(qids.max()) + 1, -1, dtype=np.int64)
+        col_of[qids] = np.arange(len(qids))
+
+        test_ids = [
+            int(r[0])
+            for r in s.execute(select(Test.id).where(Test.status == "completed").order_by(Test.id.asc())).all()
+        ]
+
+        scanned = changed = flipped = 0
+        for start in range(0, len(test_ids), max(1, args.batch_size)):
+            chunk = np.array(test_ids[start : start + args.batch_size], dtype=np.int64)
+            rows = s.execute(
+                select(Answer.test_id, Answer.question_id, Answer.value).where(Answer.test_id.in_(chunk.tolist()))
+            ).all()
+
+            values = np.zeros((len(chunk), len(qids)), dtype=np.int64)
+            if rows:
+                arr = np.array([tuple(r) for r in rows], dtype=np.int64)
+                # Answers to deleted or non-scoring questions have no column and are ignored.
+                known = (arr[:, 1] >= 0) & (arr[:, 1] < len(col_of))
+                cols = np.full(len(arr), -1, dtype=np.int64)
+                cols[known] = col_of[arr[known, 1]]
+                keep = cols >= 0
+                values[np.searchsorted(chunk, arr[keep, 0]), cols[keep]] = arr[keep, 2]
+
+            results = batch_to_results(score_batch(dimension_index, signs, values))
+            tests = {t.id: t for t in s.execute(select(Test).where(Test.id.in_(chunk.tolist()))).scalars()}
+            for test_id, result in zip(chunk.tolist(), results):
+                scanned += 1
+                t = tests[test_id]
+                stored = dict(t.result_json or {})
+                notes = boundary_notes(result["dimensions"])
+                # Polarity edits can move percents and boundary notes without flipping a letter.
+                if (
+                    t.result_type == result["type"]
+                    and stored.get("type") == result["type"]
+                    and stored.get("dimensions") == result["dimensions"]
+                    and stored.get("boundary_notes") == notes
+                ):
+                    continue
+                changed += 1
+                if t.result_type != result["type"]:
+                    flipped += 1
+                    print(f"test {test_id}: {t.result_type} -> {result['type']}")
+                else:
+                    print(f"test {test_id}: {t.result_type} (dimensions updated)")
+                if args.apply:
+                    stored.update({"type": result["type"], "dimensions": result["dimensions"], "boundary_notes": notes})
+                    t.result_type = result["type"]
+                    t.result_json = stored
+            if args.apply:
+                s.commit()
+
+    print(
+        f"Scanned {scanned} tests, {changed} changed, {flipped} with a new type"
+        f"{'' if args.apply else ' (dry run)'}."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -10,15 +10,26 @@ sys.path.insert(0, str(PROJECT_ROOT))
 
 
 @pytest.fixture()
-def engine():
+def engine(tmp_path):
     from sqlalchemy import create_engine
-    from sqlalchemy.pool import StaticPool
 
-    return create_engine(
-        "sqlite+pysqlite:///:memory:",
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
-    )
+    # A file rather than :memory: so the sync and async engines see the same database.
+    eng = create_engine(f"sqlite+pysqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    yield eng
+    eng.dispose()
+
+
+@pytest.fixture()
+def async_engine(engine):
+    import asyncio
+
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    # NullPool: connections are opened on whichever event loop uses them (TestClient runs its own).
+    eng = create_async_engine(engine.url.set(drivername="sqlite+aiosqlite"), poolclass=NullPool)
+    yield eng
+    asyncio.run(eng.dispose())
 
 
 @pytest.fixture()
@@ -41,14 +52,29 @@ def db(SessionLocal, engine):
 
 
 @pytest.fixture()
-def client(SessionLocal, engine):
+def client(SessionLocal, engine, async_engine):
     from fastapi.testclient import TestClient
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from sqlalchemy.orm import sessionmaker
 
-    from app.db import get_db
+    from app.db import (
+        RoutingSession,
+        get_async_db,
+        get_async_read_session_factory,
+        get_async_session_factory,
+        get_db,
+        get_read_session_factory,
+        get_session_factory,
+    )
     from app.models import Base
     from app.main import app
+    from app.services.error_sink import ErrorLogSink
+    from app.services.profile_context import invalidate_profile_context
+    from app.services.question_bank import invalidate_question_bank
 
     Base.metadata.create_all(bind=engine)
+    invalidate_question_bank()
+    invalidate_profile_context()  # ids restart at 1 in each fresh per-test database file
 
     def override_get_db():
         session = SessionLocal()
@@ -57,7 +83,26 @@ def client(SessionLocal, engine):
         finally:
             session.close()
 
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with AsyncSessionLocal() as session:
+            yield session
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    # No replica in tests: read-only routes route everything to the test database.
+    ReadSessionLocal = sessionmaker(class_=RoutingSession, primary=engine, replica=None, expire_on_commit=False)
+    AsyncReadSessionLocal = async_sessionmaker(
+        sync_session_class=RoutingSession, primary=async_engine.sync_engine, replica=None, expire_on_commit=False
+    )
+    app.dependency_overrides[get_read_session_factory] = lambda: ReadSessionLocal
+    app.dependency_overrides[get_async_read_session_factory] = lambda: AsyncReadSessionLocal
+    app.dependency_overrides[get_session_factory] = lambda: SessionLocal
+    app.dependency_overrides[get_async_session_factory] = lambda: AsyncSessionLocal
     with TestClient(app) as c:
+        # The lifespan sink writes through the app's SessionLocal; swap in one bound to the test database.
+        c.portal.call(app.state.error_sink.aclose)
+        app.state.error_sink = ErrorLogSink(SessionLocal)
         yield c
     app.dependency_overrides.clear()
@@ -8,3 +8,82 @@ def test_admin_requires_login_when_configured(client, monkeypatch):
     r = client.get("/admin", follow_redirects=False)
     assert r.status_code == 303
     assert r.headers.get("location", "").startswith("/admin/login")
+
+
+def test_feedback_dashboard_round_trip(client, db):
+    from app.models import Feedback
+
+    for rating in (5, 4, 3):
+        r = client.post("/submit_feedback", json={"rating": rating, "content": f"评分 {rating}", "mbti_type": "intj"})
+        assert r.status_code == 200
+
+    page = client.get("/admin/dashboard", params={"key": "jackson_admin"})
+    assert page.status_code == 200
+    assert "共 3 条" in page.text
+    assert ">4.0<" in page.text
+
+    newest = db.query(Feedback).order_by(Feedback.id.desc()).first()
+    assert client.delete(f"/admin/delete_feedback/{newest.id}", params={"key": "jackson_admin"}).json()["success"]
+    assert client.post("/admin/feedbacks/clear", params={"key": "jackson_admin"}).json()["success"]
+    assert db.query(Feedback).count() == 0
+
+
+def test_dashboard_pages_by_cursor_and_reads_maintained_counts(client, db, async_engine):
+    import re
+    from datetime import datetime, timezone
+    from html import unescape
+
+    from sqlalchemy import event
+
+    from app.models import Feedback, TableCounter
+
+    same_time = datetime(2026, 1, 1, tzinfo=timezone.utc)  # ties are ordered by id
+    db.add_all(Feedback(rating=1 + i % 5, content=f"第{i}条", created_at=same_time) for i in range(12))
+    db.commit()
+
+    def _page(url):
+        r = client.get(url)
+        assert r.status_code == 200
+        contents = re.findall(r"第(\d+)条", r.text)
+        pattern = r'href="([^"]+)"\s+class="[^"]*"\s*>(上一页|下一页)<'
+        links = {m.group(2): unescape(m.group(1)) for m in re.finditer(pattern, r.text)}
+        return [int(c) for c in dict.fromkeys(contents)], links, r.text
+
+    first, links, text = _page("/admin/dashboard?key=jackson_admin")
+    assert first == [11, 10, 9, 8, 7]
+    assert "共 12 条" in text and ">2.8<" in text  # 33 / 12
+    assert set(links) == {"下一页"}
+
+    second, links, _ = _page(links["下一页"])
+    assert second == [6, 5, 4, 3, 2]
+    third, links, _ = _page(links["下一页"])
+    assert third == [1, 0]
+    assert set(links) == {"上一页"}
+    back, _links, _ = _page(links["上一页"])
+    assert back == second
+
+    # Counters are seeded by the first dashboard load and kept in step by writes from then on.
+    assert db.get(TableCounter, "feedback.count").value == 12
+    assert client.post("/submit_feedback", json={"rating": 5}).status_code == 200
+
+    statements: list[str] = []
+
+    def _record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _record)
+    try:
+        _ids, _links, text = _page("/admin/dashboard?key=jackson_admin")
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", _record)
+    assert "共 13 条" in text
+    assert any("table_counters" in s for s in statements)
+    assert not [s for s in statements if "count(" in s.lower()]
+
+    oldest_id, oldest_rating = db.query(Feedback.id, Feedback.rating).order_by(Feedback.id).first()
+    assert client.delete(f"/admin/delete_feedback/{oldest_id}", params={"key": "jackson_admin"}).json()["success"]
+    # A second delete of the same row (double click, another tab) must not move the counters again.
+    assert client.delete(f"/admin/delete_feedback/{oldest_id}", params={"key": "jackson_admin"}).status_code == 404
+    db.expire_all()
+    assert db.get(TableCounter, "feedback.count").value == 12
+    assert db.get(TableCounter, "feedback.rating_sum").value == 33 + 5 - oldest_rating
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import json
+
+
+_CARD = {
+    "manual": {"do_list": ["a"], "dont_list": ["b"], "recharge": "睡觉"},
+    "war": {"title": "理性的暴君 vs 感性的诗人", "description": "纠结"},
+    "relationships": {
+        "soulmate": {"mbti": "INFP", "role": "诗人", "desc": "懂你"},
+        "nemesis": {"mbti": "ESTJ", "role": "监工", "desc": "管你"},
+    },
+    "character": {"name": "夏洛克", "source": "神探夏洛克", "quote": "…", "desc": "像"},
+}
+
+
+class _FakeCardPool:
+    def __init__(self, calls, on_call=None):
+        from types import SimpleNamespace
+
+        async def create(**kw):
+            calls.append(kw)
+            if on_call is not None:
+                on_call()
+            message = SimpleNamespace(content=json.dumps(_CARD, ensure_ascii=False))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+        self._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    def client(self, api_key, base_url):
+        return self._client
+
+
+def test_content_card_is_cached_by_bucketed_profile(client, monkeypatch):
+    from app.main import app
+    from app.routes import public
+    from app.services.llm import get_llm_clients
+
+    calls: list[dict] = []
+    monkeypatch.setenv("MBTI_AI_API_KEY", "test-key")
+    app.dependency_overrides[get_llm_clients] = lambda: _FakeCardPool(calls)
+    public._content_card_cache.clear()
+
+    dims = {"E": 61, "I": 39, "S": 30, "N": 70, "T": 52, "F": 48, "J": 80, "P": 20}
+    first = client.post("/analysis/content_card", json={"type": "ENTJ", "dimensions": dims})
+    assert first.status_code == 200
+    assert "夏洛克" in first.text
+    assert len(calls) == 1
+
+    # Same buckets (60/40, 30/70, 50/50, 80/20) -> memory tier.
+    nearby = dict(dims, E=59, I=41, T=51, F=49)
+    again = client.post("/analysis/content_card", json={"type": "entj", "dimensions": nearby})
+    assert "夏洛克" in again.text
+    assert "width: 51%" in again.text  # the war bar still shows the exact percentages
+    assert len(calls) == 1
+
+    # Empty memory tier -> DB tier.
+    public._content_card_cache.clear()
+    assert client.post("/analysis/content_card", json={"type": "ENTJ", "dimensions": dims}).text == first.text
+    assert len(calls) == 1
+
+    client.post("/analysis/content_card", json={"type": "ENTJ", "dimensions": dict(dims, J=20, P=80)})
+    assert len(calls) == 2
+
+
+def test_content_card_llm_call_does_not_hold_a_db_connection(client, monkeypatch):
+    from app.db import pool_usage
+    from app.main import app
+    from app.routes import public
+    from app.services.llm import get_llm_clients
+
+    calls: list[dict] = []
+    held: list[int] = []
+    monkeypatch.setenv("MBTI_AI_API_KEY", "test-key")
+    app.dependency_overrides[get_llm_clients] = lambda: _FakeCardPool(calls, lambda: held.append(pool_usage.checked_out))
+    public._content_card_cache.clear()
+
+    baseline = pool_usage.checked_out
+    dims = {"E": 20, "I": 80, "S": 45, "N": 55, "T": 70, "F": 30, "J": 60, "P": 40}
+    r = client.post("/analysis/content_card", json={"type": "INTJ", "dimensions": dims})
+    assert r.status_code == 200 and "夏洛克" in r.text
+    assert held == [baseline]
+
+    public._content_card_cache.clear()
+    assert client.post("/analysis/content_card", json={"type": "INTJ", "dimensions": dims}).text == r.text
+    assert len(calls) == 1  # stored through the short-lived session
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    from app.services.cache import TTLCache
+
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the oldest
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_ttl_cache_expires_entries():
+    from app.services.cache import TTLCache
+
+    now = [100.0]
+    cache = TTLCache(maxsize=8, ttl=10, clock=lambda: now[0])
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=30)
+
+    now[0] += 10
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.pop("b") == 2
+    assert cache.get("b", "missing") == "missing"
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import importlib
 
+import pytest
 import sqlalchemy
 
 
@@ -77,3 +78,137 @@ def test_db_sets_sqlite_check_same_thread(monkeypatch):
     monkeypatch.delenv("MBTI_DATABASE_URL", raising=False)
 
     _reload_app_modules()
+
+
+def test_engine_options_default_to_pre_ping_and_recycle_for_server_databases(monkeypatch):
+    from app.db import _engine_options
+
+    for env in ("MBTI_DB_POOL_SIZE", "MBTI_DB_MAX_OVERFLOW", "MBTI_DB_POOL_PRE_PING", "MBTI_DB_POOL_RECYCLE_SECONDS"):
+        monkeypatch.delenv(env, raising=False)
+
+    assert _engine_options("sqlite:///./mbti.db") == {}
+    assert _engine_options("postgresql://u:p@h/db") == {"pool_pre_ping": True, "pool_recycle": 1800}
+
+    monkeypatch.setenv("MBTI_DB_POOL_SIZE", "10")
+    monkeypatch.setenv("MBTI_DB_MAX_OVERFLOW", "5")
+    monkeypatch.setenv("MBTI_DB_POOL_PRE_PING", "0")
+    monkeypatch.setenv("MBTI_DB_POOL_RECYCLE_SECONDS", "0")
+    assert _engine_options("postgresql://u:p@h/db") == {"pool_size": 10, "max_overflow": 5}
+
+
+def test_sqlite_pragmas_are_applied_on_connect(monkeypatch, tmp_path):
+    from sqlalchemy import create_engine, text
+
+    from app.db import _sqlite_pragmas, apply_sqlite_pragmas
+
+    monkeypatch.setenv("MBTI_SQLITE_JOURNAL_MODE", "wal")
+    monkeypatch.setenv("MBTI_SQLITE_SYNCHRONOUS", "normal")
+    monkeypatch.setenv("MBTI_SQLITE_BUSY_TIMEOUT_MS", "5000")
+    monkeypatch.delenv("MBTI_SQLITE_MMAP_SIZE", raising=False)
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'wal.db'}", connect_args={"check_same_thread": False})
+    apply_sqlite_pragmas(engine, _sqlite_pragmas())
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    engine.dispose()
+
+    monkeypatch.setenv("MBTI_SQLITE_SYNCHRONOUS", "normal; DROP TABLE tests")
+    with pytest.raises(ValueError):
+        _sqlite_pragmas()
+
+
+def test_routing_session_reads_replica_until_it_writes(tmp_path):
+    import asyncio
+
+    from sqlalchemy import create_engine, select
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from app.db import RoutingSession
+    from app.models import Base, Feedback
+
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    for eng in (primary, replica):
+        Base.metadata.create_all(eng)
+
+    with RoutingSession(primary=primary, replica=replica) as db:
+        db.add(Feedback(rating=5))
+        db.commit()
+    with RoutingSession(primary=primary, replica=replica) as db:
+        assert db.scalars(select(Feedback)).all() == []  # not replicated yet
+        db.add(Feedback(rating=4))
+        db.flush()
+        assert sorted(f.rating for f in db.scalars(select(Feedback))) == [4, 5]
+        db.rollback()
+    with RoutingSession(primary=primary, replica=replica, use_primary=True) as db:
+        assert [f.rating for f in db.scalars(select(Feedback))] == [5]
+    with RoutingSession(primary=primary, replica=None) as db:
+        assert [f.rating for f in db.scalars(select(Feedback))] == [5]
+
+    async def _async_reads():
+        a_primary = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'primary.db'}")
+        a_replica = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}")
+        factory = async_sessionmaker(
+            sync_session_class=RoutingSession, primary=a_primary.sync_engine, replica=a_replica.sync_engine
+        )
+        try:
+            async with factory() as db:
+                replica_rows = (await db.scalars(select(Feedback))).all()
+            async with factory(use_primary=True) as db:
+                primary_rows = (await db.scalars(select(Feedback))).all()
+        finally:
+            await a_primary.dispose()
+            await a_replica.dispose()
+        return len(replica_rows), len(primary_rows)
+
+    assert asyncio.run(_async_reads()) == (0, 1)
+    primary.dispose()
+    replica.dispose()
+
+
+def test_async_url_translates_sslmode_for_asyncpg():
+    from sqlalchemy import make_url
+
+    from app.db import _async_database_url
+
+    url = make_url(_async_database_url("postgresql://u:p@h:5432/db?sslmode=require&application_name=mbti"))
+    assert url.drivername == "postgresql+asyncpg"
+    _args, kwargs = url.get_dialect()().create_connect_args(url)
+    assert kwargs["ssl"] == "require"
+    assert "sslmode" not in kwargs
+    assert kwargs["application_name"] == "mbti"
+
+    # An explicit ssl= wins; URLs without sslmode are left alone.
+    assert make_url(_async_database_url("postgresql://h/db?sslmode=disable&ssl=verify-full")).query == {
+        "ssl": "verify-full"
+    }
+    assert _async_database_url("postgresql://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+
+
+def test_async_replica_url_is_converted_like_the_primary(monkeypatch):
+    import app.db
+
+    original_create_engine = sqlalchemy.create_engine
+
+    def fake_create_engine(url, *args, **kwargs):
+        if str(url).startswith("sqlite"):
+            return original_create_engine(url, *args, **kwargs)
+
+        class DummyEngine:
+            pass
+
+        return DummyEngine()
+
+    monkeypatch.setattr(sqlalchemy, "create_engine", fake_create_engine)
+    monkeypatch.setenv("MBTI_DATABASE_REPLICA_URL", "postgres://u:p@replica/db?sslmode=require")
+    monkeypatch.delenv("MBTI_ASYNC_DATABASE_REPLICA_URL", raising=False)
+    monkeypatch.delenv("MBTI_DATABASE_URL", raising=False)
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    try:
+        _reload_app_modules()
+        assert app.db.ASYNC_REPLICA_DATABASE_URL == "postgresql+asyncpg://u:p@replica/db?ssl=require"
+    finally:
+        monkeypatch.undo()
+        _reload_app_modules()
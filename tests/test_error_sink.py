@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import asyncio
+
+
+def test_error_sink_coalesces_identical_errors_into_one_row(db, SessionLocal):
+    from app.models import ErrorLog
+    from app.services.error_sink import ErrorLogSink
+
+    sink = ErrorLogSink(SessionLocal, flush_seconds=60, batch_size=100, raw_limit=10)
+
+    async def main():
+        for _ in range(30):
+            sink.record_exception(TimeoutError("upstream timed out"), "x" * 50)
+        sink.record_exception(ValueError("bad json"), "{")
+        assert sink.pending() == 2
+        await sink.aclose()
+
+    asyncio.run(main())
+
+    rows = {r.error_type: r for r in db.query(ErrorLog).all()}
+    assert set(rows) == {"TimeoutError", "ValueError"}
+    assert rows["TimeoutError"].error_msg.endswith("[合并 30 条相同错误]")
+    assert rows["TimeoutError"].raw_response.startswith("x" * 10 + "\n…[已截断")
+    assert rows["ValueError"].error_msg == "bad json"
+    assert sink.snapshot() == {"pending": 0, "recorded": 31, "written": 2}
+
+
+def test_error_sink_flushes_when_batch_is_full(db, SessionLocal):
+    from app.models import ErrorLog
+    from app.services.error_sink import ErrorLogSink
+
+    sink = ErrorLogSink(SessionLocal, flush_seconds=60, batch_size=3)
+
+    async def main():
+        for i in range(3):
+            sink.record("RuntimeError", f"error {i}")
+        for _ in range(50):
+            if not sink.pending() and sink.written:
+                break
+            await asyncio.sleep(0.01)
+        written = sink.written
+        await sink.aclose()
+        return written
+
+    assert asyncio.run(main()) == 3  # before the 60s interval or shutdown
+    assert db.query(ErrorLog).count() == 3
+
+
+def test_error_sink_is_created_by_the_lifespan(client):
+    from app.main import app
+
+    app.state.error_sink.record("RuntimeError", "boom")
+    body = client.get("/admin/metrics").json()["error_sink"]
+    assert body["recorded"] == 1 and body["pending"] + body["written"] == 1
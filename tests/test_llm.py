@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+
+def test_single_flight_shares_one_upstream_with_late_joiners():
+    from app.services.llm import SingleFlight
+
+    calls = 0
+    release = asyncio.Event()
+
+    async def upstream():
+        nonlocal calls
+        calls += 1
+        yield "a"
+        yield "b"
+        await release.wait()
+        yield "c"
+
+    async def consume(sub):
+        out = []
+        async with sub:
+            async for piece in sub:
+                out.append(piece)
+        return out, sub.claim()
+
+    async def main():
+        group = SingleFlight()
+        first = group.join("k", upstream)
+        task = asyncio.create_task(consume(first))
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+        second = group.join("k", upstream)  # joins after "a", "b" were produced
+        assert first.leader and not second.leader
+        late = asyncio.create_task(consume(second))
+        await asyncio.sleep(0)
+        release.set()
+        return await task, await late, group.in_flight("k")
+
+    (out1, claim1), (out2, claim2), in_flight = asyncio.run(main())
+    assert calls == 1
+    assert out1 == out2 == ["a", "b", "c"]
+    assert sorted([claim1, claim2]) == [False, True]
+    assert not in_flight
+
+
+def test_single_flight_propagates_errors_and_cancels_abandoned_streams():
+    from app.services.llm import SingleFlight
+
+    state = {"closed": False}
+
+    async def failing():
+        yield "x"
+        raise RuntimeError("boom")
+
+    async def endless():
+        try:
+            while True:
+                yield "."
+                await asyncio.sleep(0)
+        finally:
+            state["closed"] = True
+
+    async def main():
+        group = SingleFlight()
+        got: list[str] = []
+        try:
+            async with group.join("err", failing) as sub:
+                async for piece in sub:
+                    got.append(piece)
+        except RuntimeError as e:
+            error = str(e)
+
+        async with group.join("loop", endless) as sub:
+            async for _piece in sub:
+                break
+        for _ in range(5):
+            await asyncio.sleep(0)
+        return got, error, group.in_flight("loop")
+
+    got, error, in_flight = asyncio.run(main())
+    assert got == ["x"]
+    assert error == "boom"
+    assert not in_flight
+    assert state["closed"]
+
+
+def test_prompt_fingerprint_depends_on_model_and_messages():
+    from app.services.llm import prompt_fingerprint
+
+    messages = [{"role": "user", "content": "hi"}]
+    assert prompt_fingerprint("m", messages) == prompt_fingerprint("m", [dict(messages[0])])
+    assert prompt_fingerprint("m", messages) != prompt_fingerprint("n", messages)
+    assert prompt_fingerprint("m", messages) != prompt_fingerprint("m", [{"role": "user", "content": "hey"}])
+
+
+def test_llm_client_pool_reuses_clients_per_endpoint():
+    from app.services.llm import LLMClientPool
+
+    async def main():
+        pool = LLMClientPool()
+        a = pool.client("key", "https://example.invalid/v1")
+        assert pool.client("key", "https://example.invalid/v1") is a
+        assert pool.client("key", "https://other.invalid/v1") is not a
+        await pool.aclose()
+        assert pool.client("key", "https://example.invalid/v1") is not a
+        await pool.aclose()
+
+    asyncio.run(main())
+
+
+def test_lifespan_creates_shared_llm_pool(client):
+    from app.main import app
+    from app.services.llm import LLMClientPool
+
+    assert isinstance(app.state.llm_clients, LLMClientPool)
+
+
+def test_scheduler_caps_in_flight_and_admits_by_priority():
+    from app.services.llm import PRIORITY_BACKGROUND, PRIORITY_CARD, PRIORITY_INTERACTIVE, LLMScheduler
+
+    order: list[str] = []
+
+    async def main():
+        scheduler = LLMScheduler(max_in_flight=1)
+        gate = asyncio.Event()
+
+        async def run(name, priority):
+            async with scheduler.slot(priority):
+                order.append(name)
+                await gate.wait()
+
+        first = asyncio.create_task(run("first", PRIORITY_BACKGROUND))
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.create_task(run("background", PRIORITY_BACKGROUND)),
+            asyncio.create_task(run("card", PRIORITY_CARD)),
+            asyncio.create_task(run("interactive", PRIORITY_INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        snap = scheduler.snapshot()
+        gate.set()
+        await asyncio.gather(first, *waiters)
+        return snap, scheduler.snapshot()
+
+    during, after = asyncio.run(main())
+    assert order == ["first", "interactive", "card", "background"]
+    assert during["in_flight"] == 1
+    assert during["queue_depth"] == {"interactive": 1, "card": 1, "background": 1}
+    assert after["in_flight"] == 0
+    assert after["wait_seconds"]["background"]["count"] == 2
+
+
+def test_joining_a_background_flight_boosts_its_priority():
+    from app.services.llm import PRIORITY_BACKGROUND, PRIORITY_CARD, PRIORITY_INTERACTIVE, LLMScheduler, SingleFlight
+
+    order: list[str] = []
+
+    async def main():
+        scheduler = LLMScheduler(max_in_flight=1)
+        group = SingleFlight(scheduler)
+        gate = asyncio.Event()
+
+        def upstream(name):
+            async def gen():
+                order.append(name)
+                await gate.wait()
+                yield name
+
+            return gen
+
+        async def consume(sub):
+            async with sub:
+                return [p async for p in sub]
+
+        busy = asyncio.create_task(consume(group.join("busy", upstream("busy"), priority=PRIORITY_CARD)))
+        await asyncio.sleep(0)
+        card = asyncio.create_task(consume(group.join("card", upstream("card"), priority=PRIORITY_CARD)))
+        bg = asyncio.create_task(consume(group.join("report", upstream("report"), priority=PRIORITY_BACKGROUND)))
+        await asyncio.sleep(0)
+        user = asyncio.create_task(consume(group.join("report", upstream("report"), priority=PRIORITY_INTERACTIVE)))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(busy, card, bg, user)
+
+    asyncio.run(main())
+    assert order == ["busy", "report", "card"]
+
+
+def test_admin_metrics_exposes_scheduler_state(client):
+    r = client.get("/admin/metrics")
+    assert r.status_code == 200
+    body = r.json()["llm_scheduler"]
+    assert set(body["queue_depth"]) == {"interactive", "card", "background"}
+    assert "avg" in body["wait_seconds"]["interactive"]
+
+
+def test_circuit_breaker_opens_half_opens_and_recovers():
+    from app.services.llm import CircuitBreaker, CircuitOpenError
+
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, window_seconds=10, cooldown_seconds=5, clock=lambda: now[0])
+
+    async def call(fail: bool):
+        async with breaker.guard():
+            if fail:
+                raise RuntimeError("boom")
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await call(True)
+        assert breaker.is_open()
+        with pytest.raises(CircuitOpenError):
+            await call(False)
+        assert breaker.short_circuited == 1
+
+        now[0] = 6.0  # cooldown elapsed: one trial call, failing re-opens
+        assert breaker.state == "half_open"
+        with pytest.raises(RuntimeError):
+            await call(True)
+        assert breaker.state == "open"
+
+        now[0] = 12.0
+        await call(False)
+        assert breaker.state == "closed"
+
+    asyncio.run(main())
+
+
+def test_open_breaker_short_circuits_ai_routes(client, monkeypatch):
+    from app.main import app
+    from app.services.llm import get_llm_clients, llm_breaker
+
+    calls: list[object] = []
+
+    class _Pool:
+        def client(self, api_key, base_url):
+            calls.append(api_key)
+            raise AssertionError("LLM must not be called while the circuit is open")
+
+    monkeypatch.setenv("MBTI_AI_API_KEY", "test-key")
+    app.dependency_overrides[get_llm_clients] = lambda: _Pool()
+    monkeypatch.setattr(llm_breaker, "_opened_at", llm_breaker._clock())
+    try:
+        card = client.post("/analysis/content_card", json={"type": "INFP", "dimensions": {}})
+        assert card.status_code == 200
+        assert "AI 服务暂时繁忙" in card.text
+
+        stream = client.post("/analysis/content", json={"type": "INFP", "dimensions": {}})
+        assert "AI 服务暂时繁忙" in stream.text
+    finally:
+        llm_breaker.record_success()
+    assert calls == []
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import asyncio
+import random
+
+from app.routes.public import _clean_ai_markdown
+from app.services.markdown_stream import MarkdownSanitizer, sanitize_markdown_stream
+
+_PIECES = [
+    "#", "##", "####### ", " ", "\t", "\uFE0F", "\u200B", "\u00A0", "\u3000", "\n", "*", "**", "正文", "a",
+    "TAGS_SHORT_READ_WARNING ", "false", "true", "TAGS_SHORT_READ_WARNING false", "TAGS_SHORT_READ_WARNING true",
+]
+
+
+def _run(parts: list[str]) -> str:
+    sanitizer = MarkdownSanitizer()
+    return "".join(sanitizer.feed(p) for p in parts) + sanitizer.flush()
+
+
+def test_sanitizer_matches_batch_cleaner_on_random_splits():
+    rng = random.Random(17)
+    for _ in range(3000):
+        text = "".join(rng.choice(_PIECES) for _ in range(rng.randint(0, 40)))
+        cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(0, 8))))
+        parts = [text[a:b] for a, b in zip([0, *cuts], [*cuts, len(text)])]
+        assert _run(parts) == _clean_ai_markdown(text), (text, parts)
+
+
+def test_sanitizer_matches_batch_cleaner_char_by_char():
+    text = (
+        "  \u3000## \uFE0F **  标题\n正文 #\t标签\n TAGS_SHORT_READ_WARNING false\n"
+        "\u200B### 二级\n普通 ** 文本\nTAGS_SHORT_READTAGS_SHORT_READ_WARNING true_WARNING true\n  \n"
+    )
+    assert _run(list(text)) == _clean_ai_markdown(text)
+
+
+def test_sanitize_markdown_stream_skips_empty_output():
+    async def chunks():
+        for part in ["\n  ", "#", "  **", " 你好", None, "\n\n"]:
+            yield part
+
+    async def collect():
+        return [p async for p in sanitize_markdown_stream(chunks())]
+
+    out = asyncio.run(collect())
+    assert all(out)
+    assert "".join(out) == "# **你好"
@@ -15,4 +15,5 @@ def test_models_create_tables(tmp_path: Path):
     inspector = inspect(engine)
     tables = set(inspector.get_table_names())
     assert {"questions", "tests", "test_items", "answers"} <= tables
+    assert "ix_feedback_created_at_id" in {ix["name"] for ix in inspector.get_indexes("feedback")}
 
@@ -151,3 +151,471 @@ def test_complete_flow_generates_result(client, db):
     assert 'id="ai-loading-box"' in result.text
     assert 'id="ai-result-box"' in result.text
     assert "/result/ai_content/" in result.text
+
+
+def _start_test(client, db, mode: int = 20):
+    from app.models import Test
+    from app.services.tokens import hash_token
+
+    client.get("/")
+    csrf = client.cookies.get("csrf_token")
+    client.post(
+        "/start",
+        data={"mode": str(mode), "resume_expiry": "7d", "csrf_token": csrf},
+        follow_redirects=False,
+    )
+    test_hash = hash_token(client.cookies.get("test_token"), secret="dev-secret-change-me")
+    return csrf, db.query(Test).filter(Test.test_token_hash == test_hash).one()
+
+
+def test_start_inserts_items_in_position_order(client, db):
+    from app.models import TestItem
+
+    _seed_questions(db, per_dim=5)
+    _csrf, test_row = _start_test(client, db)
+
+    items = db.query(TestItem).filter(TestItem.test_id == test_row.id).order_by(TestItem.position.asc()).all()
+    assert [it.position for it in items] == list(range(1, 21))
+    assert len({it.question_id for it in items}) == 20
+    assert not any(it.is_extra for it in items)
+
+
+def test_answers_autosave_appends_tie_breaker_items(client, db):
+    from app.models import Question, TestItem
+    from app.services.question_bank import invalidate_question_bank
+
+    _seed_questions(db, per_dim=5)
+    csrf, test_row = _start_test(client, db)
+
+    extra = Question(dimension="EI", agree_pole="I", text="加测题", is_active=True, source="tie_breaker")
+    db.add(extra)
+    db.commit()
+    invalidate_question_bank()
+
+    items = db.query(TestItem).filter(TestItem.test_id == test_row.id).all()
+    answers = {str(it.question_id): 3 for it in items}
+    answers[str(extra.id)] = 4
+
+    r = client.post("/test/answers", json={"csrf_token": csrf, "intent": "finish", "answers": answers})
+    assert r.status_code == 200
+    assert r.json()["status"] == "complete"
+
+    appended = db.query(TestItem).filter(TestItem.test_id == test_row.id, TestItem.is_extra.is_(True)).one()
+    assert appended.question_id == extra.id
+    assert appended.position == 21
+
+
+def test_answers_autosave_upserts_and_reports_missing_position(client, db):
+    from app.models import Answer, TestItem
+
+    _seed_questions(db, per_dim=5)
+    csrf, test_row = _start_test(client, db)
+    items = db.query(TestItem).filter(TestItem.test_id == test_row.id).order_by(TestItem.position.asc()).all()
+
+    first = {str(it.question_id): 2 for it in items[:10]}
+    r = client.post("/test/answers", json={"csrf_token": csrf, "intent": "save", "answers": first})
+    assert r.json()["status"] == "saved"
+
+    second = {str(items[0].question_id): 5}
+    r = client.post("/test/answers", json={"csrf_token": csrf, "intent": "finish", "answers": second})
+    data = r.json()
+    assert data["status"] == "incomplete"
+    assert data["missing_position"] == 11
+
+    rows = db.query(Answer).filter(Answer.test_id == test_row.id).all()
+    assert len(rows) == 10
+    assert {a.question_id: a.value for a in rows}[items[0].question_id] == 5
+
+
+def test_answers_delta_sync_tracks_revisions_and_rejects_stale_base(client, db):
+    from app.models import Answer, TestItem
+
+    _seed_questions(db, per_dim=5)
+    csrf, test_row = _start_test(client, db)
+    items = db.query(TestItem).filter(TestItem.test_id == test_row.id).order_by(TestItem.position.asc()).all()
+    q1, q2 = str(items[0].question_id), str(items[1].question_id)
+
+    r = client.post("/test/answers", json={"csrf_token": csrf, "base_revision": 0, "changes": {q1: 4}})
+    assert r.status_code == 200
+    assert r.json() == {"status": "saved", "revision": 1}
+
+    r = client.post("/test/answers", json={"csrf_token": csrf, "base_revision": 1, "changes": {q2: 2}})
+    assert r.json()["revision"] == 2
+
+    stale = client.post("/test/answers", json={"csrf_token": csrf, "base_revision": 1, "changes": {q1: 1}})
+    assert stale.status_code == 409
+    assert stale.json() == {"status": "conflict", "revision": 2}
+
+    values = {a.question_id: a.value for a in db.query(Answer).filter(Answer.test_id == test_row.id).all()}
+    assert values == {items[0].question_id: 4, items[1].question_id: 2}
+
+    # A full-map sync is always accepted and moves the revision forward.
+    r = client.post("/test/answers", json={"csrf_token": csrf, "answers": {q1: 1}})
+    assert r.json()["revision"] == 3
+    page = client.get("/test")
+    assert "let syncRevision = 3;" in page.text
+
+
+def test_tie_breaker_pool_is_served_with_etag(client, db):
+    from app.models import Question
+    from app.services.question_bank import invalidate_question_bank
+
+    _seed_questions(db, per_dim=5)
+    _start_test(client, db)
+
+    db.add(Question(dimension="TF", agree_pole="F", text="加测题 TF", is_active=True, source="tie_breaker"))
+    db.commit()
+    invalidate_question_bank()
+
+    page = client.get("/test")
+    assert "/test/tie_breakers?v=" in page.text
+    assert "加测题 TF" not in page.text
+
+    r = client.get("/test/tie_breakers")
+    assert r.status_code == 200
+    assert [q["text"] for q in r.json()["T-F"]] == ["加测题 TF"]
+    etag = r.headers["etag"]
+    assert "max-age" in r.headers["cache-control"]
+
+    versioned = client.get(f"/test/tie_breakers?v={etag.strip(chr(34))}")
+    assert "immutable" in versioned.headers["cache-control"]
+
+    cached = client.get("/test/tie_breakers", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+
+
+def test_running_dimension_totals_follow_answer_updates(client, db):
+    from app.models import Question, TestDimensionScore, TestItem
+    from app.services.scoring import score_all
+
+    _seed_questions(db, per_dim=5)
+    csrf, test_row = _start_test(client, db)
+    items = db.query(TestItem).filter(TestItem.test_id == test_row.id).order_by(TestItem.position.asc()).all()
+
+    answers = {str(it.question_id): (idx % 5) + 1 for idx, it in enumerate(items)}
+    client.post("/test/answers", json={"csrf_token": csrf, "answers": answers})
+    # Re-answer a few questions to exercise the diff against stored values.
+    changes = {str(it.question_id): 5 for it in items[:4]}
+    answers.update(changes)
+    client.post("/test/answers", json={"csrf_token": csrf, "base_revision": 1, "changes": changes})
+
+    questions = db.query(Question).filter(Question.id.in_([it.question_id for it in items])).all()
+    expected = score_all(
+        [{"id": q.id, "dimension": q.dimension, "agree_pole": q.agree_pole} for q in questions],
+        {int(k): v for k, v in answers.items()},
+    )["dimensions"]
+
+    rows = db.query(TestDimensionScore).filter(TestDimensionScore.test_id == test_row.id).all()
+    assert {r.dimension: (r.score, r.answered) for r in rows} == {
+        d: (expected[d]["score"], expected[d]["answered"]) for d in expected
+    }
+
+    finish = client.get("/finish")
+    assert finish.status_code == 200
+
+
+def _finish_test(client, db, *, share_expiry: str = "permanent"):
+    from app.models import TestItem
+
+    _seed_questions(db, per_dim=5)
+    csrf, test_row = _start_test(client, db)
+    items = db.query(TestItem).filter(TestItem.test_id == test_row.id).all()
+    client.post("/test/answers", json={"csrf_token": csrf, "answers": {str(it.question_id): 5 for it in items}})
+    r = client.post("/finish", data={"csrf_token": csrf, "share_expiry": share_expiry}, follow_redirects=False)
+    assert r.status_code == 303
+    return r.headers["location"], test_row
+
+
+def test_result_page_is_served_from_cache(client, db, engine):
+    from sqlalchemy import event
+
+    location, _test_row = _finish_test(client, db)
+    first = client.get(location)
+    assert first.status_code == 200
+
+    statements: list[str] = []
+
+    def _record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        second = client.get(location)
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+
+    assert second.status_code == 200
+    assert second.text == first.text
+    assert not [s for s in statements if "FROM tests" in s]
+
+
+def test_cached_result_still_honours_share_expiry(client, db):
+    from datetime import datetime, timedelta, timezone
+
+    from app.models import Test
+    from app.routes import public
+
+    location, test_row = _finish_test(client, db, share_expiry="1d")
+    assert client.get(location).status_code == 200
+
+    token_hash = db.query(Test.share_token_hash).filter(Test.id == test_row.id).scalar()
+    cached = public._result_cache.get(token_hash)
+    past = datetime.now(timezone.utc) - timedelta(seconds=1)
+    public._result_cache.set(token_hash, cached._replace(share_expires_at=past))
+
+    expired = client.get(location)
+    assert expired.status_code == 200
+    assert 'id="ai-result-box"' not in expired.text
+
+
+def test_result_page_reads_primary_right_after_finish(client, db, engine, tmp_path, monkeypatch):
+    import app.db as db_module
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.db import PRIMARY_READS_COOKIE, RoutingSession, get_read_session_factory
+    from app.main import app
+    from app.models import Base
+
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    Base.metadata.create_all(replica)  # schema only: replication has not caught up yet
+    monkeypatch.setattr(db_module, "REPLICA_DATABASE_URL", f"sqlite:///{tmp_path / 'replica.db'}")
+
+    factory = sessionmaker(class_=RoutingSession, primary=engine, replica=replica)
+    app.dependency_overrides[get_read_session_factory] = lambda: factory
+    location, _test_row = _finish_test(client, db)
+    pinned = client.cookies.get(PRIMARY_READS_COOKIE)
+    assert pinned
+
+    client.cookies.delete(PRIMARY_READS_COOKIE)
+    assert client.get(location).status_code == 404
+
+    client.cookies.set(PRIMARY_READS_COOKIE, pinned)
+    assert client.get(location).status_code == 200
+    replica.dispose()
+
+
+class _FakeStream:
+    def __init__(self, pieces):
+        self._pieces = list(pieces)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        from types import SimpleNamespace
+
+        if not self._pieces:
+            raise StopAsyncIteration
+        delta = SimpleNamespace(content=self._pieces.pop(0))
+        return SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+class _FakeLLMPool:
+    def __init__(self, pieces, calls):
+        from types import SimpleNamespace
+
+        async def create(**kw):
+            calls.append(kw)
+            return _FakeStream(pieces)
+
+        self._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    def client(self, api_key, base_url):
+        return self._client
+
+
+def test_ai_content_is_generated_once_then_replayed(client, db, monkeypatch):
+    from app.main import app
+    from app.models import AiReport
+    from app.services.llm import get_llm_clients
+
+    calls: list[dict] = []
+    pool = _FakeLLMPool(["### 灵魂", "底色\n", "**灯塔**"], calls)
+    app.dependency_overrides[get_llm_clients] = lambda: pool
+
+    location, test_row = _finish_test(client, db)  # no API key yet: nothing is pre-generated
+    monkeypatch.setenv("MBTI_AI_API_KEY", "test-key")
+    share_token = location.split("/result/")[1]
+
+    first = client.get(f"/result/ai_content/{share_token}")
+    assert first.status_code == 200
+    assert first.text == "### 灵魂底色\n**灯塔**"
+    assert len(calls) == 1
+
+    stored = db.query(AiReport).filter(AiReport.test_id == test_row.id).one()
+    assert stored.content == "### 灵魂底色\n**灯塔**"
+
+    monkeypatch.delenv("MBTI_AI_API_KEY")
+    again = client.get(f"/result/ai_content/{share_token}")
+    assert again.text == first.text
+    assert len(calls) == 1
+
+
+def test_ai_content_stream_does_not_hold_a_db_connection(client, db, monkeypatch):
+    from app.db import pool_usage
+    from app.main import app
+    from app.models import AiReport
+    from app.services.llm import get_llm_clients
+
+    calls: list[dict] = []
+    pool = _FakeLLMPool(["### 不占", "连接\n", "**完成**"], calls)
+    app.dependency_overrides[get_llm_clients] = lambda: pool
+
+    location, test_row = _finish_test(client, db)
+    monkeypatch.setenv("MBTI_AI_API_KEY", "test-key")
+    share_token = location.split("/result/")[1]
+    db.commit()
+    db.close()
+
+    held: list[int] = []
+    next_chunk = _FakeStream.__anext__
+
+    async def _recording_anext(self):
+        held.append(pool_usage.checked_out)
+        return await next_chunk(self)
+
+    monkeypatch.setattr(_FakeStream, "__anext__", _recording_anext)
+    baseline = pool_usage.checked_out
+    checkouts = pool_usage.checkouts
+
+    resp = client.get(f"/result/ai_content/{share_token}")
+    assert resp.text == "### 不占连接\n**完成**"
+    assert held and set(held) == {baseline}
+    assert pool_usage.checked_out == baseline
+    assert pool_usage.checkouts > checkouts
+    assert db.query(AiReport.content).filter(AiReport.test_id == test_row.id).scalar() == resp.text
+
+
+def test_finish_pregenerates_ai_report_in_background(client, db, monkeypatch):
+    from app.main import app
+    from app.models import AiReport
+    from app.services.llm import get_llm_clients
+
+    calls: list[dict] = []
+    monkeypatch.setenv("MBTI_AI_API_KEY", "test-key")
+    pool = _FakeLLMPool(["### 预生成", "\n**完成**"], calls)
+    app.dependency_overrides[get_llm_clients] = lambda: pool
+
+    location, test_row = _finish_test(client, db)
+    client.portal.call(app.state.report_jobs.drain)
+
+    assert len(calls) == 1
+    db.expire_all()
+    assert db.query(AiReport.content).filter(AiReport.test_id == test_row.id).scalar() == "### 预生成\n**完成**"
+
+    share_token = location.split("/result/")[1]
+    replay = client.get(f"/result/ai_content/{share_token}")
+    assert replay.text == "### 预生成\n**完成**"
+    assert len(calls) == 1
+
+
+def test_profile_context_is_memoized_per_test_and_prompt_version(client, db, engine):
+    from sqlalchemy import event
+
+    from app.services.profile_context import build_profile_context
+
+    _location, test_row = _finish_test(client, db)
+    db.refresh(test_row)
+    first = build_profile_context(db, test_row, prompt_version="v1")
+    assert first.type_code == test_row.result_type
+    assert "[立场坚定]" in first.text
+
+    statements: list[str] = []
+
+    def _record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        assert build_profile_context(db, test_row, prompt_version="v1") is first
+        assert statements == []
+        assert build_profile_context(db, test_row, prompt_version="v2") == first
+        assert statements  # another prompt version builds its own entry
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+
+
+def test_autosave_reuses_cached_token_lookup_until_finish(client, db, async_engine):
+    from sqlalchemy import event
+
+    from app.models import TestItem
+
+    _seed_questions(db, per_dim=5)
+    csrf, test_row = _start_test(client, db)
+    items = db.query(TestItem).filter(TestItem.test_id == test_row.id).order_by(TestItem.position.asc()).all()
+    answers = {str(it.question_id): 5 for it in items}
+    first_qid = str(items[0].question_id)
+    assert client.post("/test/answers", json={"csrf_token": csrf, "answers": {first_qid: 3}}).status_code == 200
+
+    statements: list[str] = []
+
+    def _record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    # /test/answers runs on the async engine
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _record)
+    try:
+        r = client.post("/test/answers", json={"csrf_token": csrf, "answers": {first_qid: 4}})
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", _record)
+    assert r.json()["status"] == "saved"
+    assert any("UPDATE test_progress" in s for s in statements)
+    # the status is checked inside that UPDATE; no separate token/test lookup
+    assert not [s for s in statements if s.lstrip().startswith("SELECT") and "FROM tests" in s]
+
+    client.post("/test/answers", json={"csrf_token": csrf, "answers": answers})
+    r = client.post("/finish", data={"csrf_token": csrf, "share_expiry": "permanent"}, follow_redirects=False)
+    assert r.status_code == 303
+    # finish dropped the cached in-progress entry, so the cookie is rejected right away
+    r = client.post("/test/answers", json={"csrf_token": csrf, "answers": {first_qid: 1}})
+    assert r.status_code == 400
+
+
+def test_autosave_rejects_finished_test_behind_stale_token_cache(client, db):
+    from app.models import Answer, TestDimensionScore, TestItem
+    from app.routes import public
+    from app.services.tokens import hash_token
+
+    _seed_questions(db, per_dim=5)
+    csrf, test_row = _start_test(client, db)
+    items = db.query(TestItem).filter(TestItem.test_id == test_row.id).all()
+    answers = {str(it.question_id): 5 for it in items}
+    client.post("/test/answers", json={"csrf_token": csrf, "answers": answers})
+    r = client.post("/finish", data={"csrf_token": csrf, "share_expiry": "permanent"}, follow_redirects=False)
+    assert r.status_code == 303
+
+    # Another worker still holds the entry it cached before the test was finished.
+    token_hash = hash_token(client.cookies.get(public.TEST_COOKIE), secret=public._app_secret())
+    public._token_cache.set(token_hash, public._TokenEntry(test_row.id, "in_progress", None))
+    scores_before = sorted((s.dimension, s.score) for s in db.query(TestDimensionScore).filter_by(test_id=test_row.id))
+
+    first_qid = str(items[0].question_id)
+    r = client.post("/test/answers", json={"csrf_token": csrf, "answers": {first_qid: 1}})
+    assert r.status_code == 400
+    assert public._token_cache.get(token_hash) is None
+
+    db.expire_all()
+    assert db.query(Answer.value).filter_by(test_id=test_row.id, question_id=int(first_qid)).scalar() == 5
+    assert sorted((s.dimension, s.score) for s in db.query(TestDimensionScore).filter_by(test_id=test_row.id)) == (
+        scores_before
+    )
+
+
+def test_save_ai_report_only_absorbs_the_duplicate_race(client, db):
+    import pytest
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    from app.models import AiReport
+    from app.routes.public import _save_ai_report
+
+    _location, test_row = _finish_test(client, db)
+    _save_ai_report(db, test_row.id, "第一份", model="m")
+    _save_ai_report(db, test_row.id, "第二份", model="m")  # lost the race: kept quietly
+    assert db.query(AiReport.content).filter(AiReport.test_id == test_row.id).scalar() == "第一份"
+
+    db.execute(text("DROP TABLE ai_reports"))
+    db.commit()
+    with pytest.raises(OperationalError):
+        _save_ai_report(db, test_row.id + 1, "报告", model="m")
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+
+def _add_question(db, dim: str, pole: str, *, source: str = "test", is_active: bool = True):
+    from app.models import Question
+
+    q = Question(dimension=dim, agree_pole=pole, text=f"[{dim}] {source}", is_active=is_active, source=source)
+    db.add(q)
+    db.commit()
+    return q
+
+
+def test_snapshot_buckets_active_questions_by_dimension_and_source(db):
+    from app.services.question_bank import get_question_bank, invalidate_question_bank
+
+    invalidate_question_bank()
+    _add_question(db, "EI", "E")
+    _add_question(db, "EI", "I", source="tie_breaker")
+    _add_question(db, "SN", "S")
+    _add_question(db, "TF", "T", is_active=False)
+
+    bank = get_question_bank(db)
+    assert len(bank.questions) == 3
+    assert [q.agree_pole for q in bank.bucket("EI")] == ["E", "I"]
+    assert [q.agree_pole for q in bank.bucket("EI", source="tie_breaker")] == ["I"]
+    assert bank.bucket("TF") == ()
+    assert bank.has_source("tie_breaker")
+    assert not bank.has_source("ai")
+
+
+def test_snapshot_is_reused_until_invalidated(db):
+    from app.services.question_bank import get_question_bank, invalidate_question_bank
+
+    invalidate_question_bank()
+    _add_question(db, "EI", "E")
+    first = get_question_bank(db)
+
+    _add_question(db, "JP", "J")
+    assert get_question_bank(db) is first
+
+    invalidate_question_bank()
+    second = get_question_bank(db)
+    assert second.version != first.version
+    assert len(second.questions) == 2
+
+
+def test_admin_toggle_invalidates_snapshot(client, db, monkeypatch):
+    from app.services.question_bank import get_question_bank
+
+    monkeypatch.delenv("MBTI_ADMIN_USERNAME", raising=False)
+    monkeypatch.delenv("MBTI_ADMIN_PASSWORD", raising=False)
+
+    q = _add_question(db, "EI", "E")
+    assert q.id in get_question_bank(db).by_id
+
+    client.get("/admin/questions")
+    csrf = client.cookies.get("csrf_token")
+    r = client.post(f"/admin/questions/{q.id}/toggle", data={"csrf_token": csrf}, follow_redirects=False)
+    assert r.status_code == 303
+
+    assert q.id not in get_question_bank(db).by_id
+
+
+def test_scoring_plan_is_compiled_once_per_snapshot(db):
+    from app.services.question_bank import get_question_bank, invalidate_question_bank
+
+    invalidate_question_bank()
+    e = _add_question(db, "EI", "E")
+    n = _add_question(db, "SN", "N")
+
+    bank = get_question_bank(db)
+    assert bank.scoring_plan is bank.scoring_plan
+    assert bank.scoring_plan.index == {e.id: (0, 1), n.id: (1, -1)}
+
+    invalidate_question_bank()
+    assert get_question_bank(db).scoring_plan is not bank.scoring_plan
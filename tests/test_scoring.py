@@ -37,3 +37,78 @@ def test_is_near_boundary_gap_rule():
     assert is_near_boundary(55, threshold_gap_percent=10) is False
     assert is_near_boundary(50, threshold_gap_percent=10) is True
 
+
+def test_score_totals_matches_score_all():
+    import random
+
+    from app.services.scoring import answer_score, score_all, score_totals
+
+    rng = random.Random(7)
+    dims = ["EI", "SN", "TF", "JP"]
+    poles = {"EI": "EI", "SN": "SN", "TF": "TF", "JP": "JP"}
+    questions = [
+        {"id": i, "dimension": dims[i % 4], "agree_pole": rng.choice(poles[dims[i % 4]])} for i in range(60)
+    ]
+    answers = {q["id"]: rng.randint(1, 5) for q in questions if rng.random() < 0.8}
+
+    totals: dict[str, tuple[int, int]] = {}
+    for q in questions:
+        if q["id"] not in answers:
+            continue
+        score, answered = totals.get(q["dimension"], (0, 0))
+        totals[q["dimension"]] = (score + answer_score(q["dimension"], q["agree_pole"], answers[q["id"]]), answered + 1)
+
+    assert score_totals(totals) == score_all(questions, answers)
+
+
+def test_score_all_batch_matches_score_all():
+    import random
+
+    import pytest
+
+    pytest.importorskip("numpy")
+    from app.services.scoring import score_all, score_all_batch
+
+    rng = random.Random(11)
+    dims = ["EI", "SN", "TF", "JP"]
+    questions = [{"id": i, "dimension": dims[i % 4], "agree_pole": rng.choice(dims[i % 4])} for i in range(64)]
+    answer_maps = [{} for _ in range(3)]
+    for _ in range(300):
+        answer_maps.append({q["id"]: rng.randint(1, 5) for q in questions if rng.random() < rng.random()})
+    # 10 answers with a net score of +1 give exactly 52.5% and exercise round-half-to-even.
+    ei = sorted((q for q in questions if q["dimension"] == "EI"), key=lambda q: q["agree_pole"])[:10]
+    answer_maps.append({q["id"]: 3 for q in ei} | {ei[0]["id"]: 4 if ei[0]["agree_pole"] == "E" else 2})
+
+    assert score_all_batch(questions, answer_maps) == [score_all(questions, a) for a in answer_maps]
+
+
+def test_score_batch_returns_arrays_per_dimension():
+    import pytest
+
+    np = pytest.importorskip("numpy")
+    from app.services.scoring import score_batch
+
+    out = score_batch([0, 0, 3], [1, -1, 1], np.array([[5, 5, 0], [1, 0, 4]]))
+    assert out["score"].tolist() == [[0, 0, 0, 0], [-2, 0, 0, 1]]
+    assert out["answered"].tolist() == [[2, 0, 0, 0], [1, 0, 0, 1]]
+    assert out["first_percent"][:, 0].tolist() == [50, 0]
+    assert out["types"] == ["ESTJ", "ISTJ"]
+
+
+def test_scoring_plan_matches_per_dimension_scan():
+    import random
+
+    from app.services.scoring import compile_scoring_plan, score_dimension
+
+    rng = random.Random(8)
+    poles = {"EI": "EI", "SN": "SN", "TF": "TF", "JP": "JP", "XX": "XY"}
+    questions = []
+    for qid in range(1, 61):
+        dim = rng.choice(list(poles))
+        questions.append({"id": qid, "dimension": dim, "agree_pole": rng.choice(poles[dim])})
+    answers = {qid: rng.randint(1, 5) for qid in range(1, 61) if rng.random() < 0.8}
+    answers[999] = 5  # not in the plan
+
+    out = compile_scoring_plan(questions).score(answers)
+    for dim in ("EI", "SN", "TF", "JP"):
+        assert out["dimensions"][dim] == score_dimension(dim, questions, answers)